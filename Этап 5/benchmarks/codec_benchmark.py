@@ -0,0 +1,38 @@
+"""The benchmark compares the pure Python and the libyaml based YAML loader and dumper
+with the JSON codec on the same list of note dicts.
+
+Run from the project directory: python -m benchmarks.codec_benchmark [number of notes]
+"""
+from dataclasses import asdict
+from io import StringIO
+import sys
+import yaml
+from benchmarks.columnar_benchmark import generate_notes, measure
+from data.file_io import NoteYamlDumper, get_codec
+
+
+class PureNoteYamlDumper(yaml.SafeDumper):
+    """The class PureNoteYamlDumper is the pure Python counterpart of NoteYamlDumper."""
+    yaml_representers = NoteYamlDumper.yaml_representers
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 4
+    dicts = [asdict(note) for note in generate_notes(count)]
+    print(f"{count} notes")
+    for name in ("yaml", "json"):
+        codec = get_codec(name)
+        text = StringIO()
+        codec.dump(dicts, text)
+        text = text.getvalue()
+        label = f"{name}, {'C' if codec.accelerated else 'pure Python'}"
+        measure(f"dump {label}", lambda: codec.dump(dicts, StringIO()))
+        measure(f"load {label}", lambda: codec.load(StringIO(text)))
+        if name == "yaml":
+            measure("dump yaml, pure Python", lambda: yaml.dump(dicts, StringIO(), Dumper=PureNoteYamlDumper,
+                                                                 allow_unicode=True))
+            measure("load yaml, pure Python", lambda: yaml.load(StringIO(text), Loader=yaml.SafeLoader))
+
+
+if __name__ == "__main__":
+    main()
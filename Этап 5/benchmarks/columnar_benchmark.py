@@ -0,0 +1,81 @@
+"""The benchmark compares the list of Note dataclasses with the columnar NumPy store
+on the urgency bucketing, the date range filter and the status counts.
+
+Run from the project directory: python -m benchmarks.columnar_benchmark [number of notes]
+"""
+from datetime import datetime, timedelta
+from random import Random
+from time import perf_counter, perf_counter_ns
+from uuid import UUID
+import sys
+from data import Note, ColumnarNoteStore
+from utils import NoteStatus
+
+
+def generate_notes(count, seed=0):
+    """The function generates a given number of random notes."""
+    rnd = Random(seed)
+    now = datetime.now()
+    statuses = list(NoteStatus)
+    return [
+        Note(
+            content="content",
+            created_date=now - timedelta(minutes=rnd.randrange(500000)),
+            id_=UUID(int=rnd.getrandbits(128)),
+            issue_date=now + timedelta(minutes=rnd.randrange(-10000, 10000)),
+            status=rnd.choice(statuses),
+            title="title",
+            username="user",
+        )
+        for _ in range(count)
+    ]
+
+
+def urgent_loop(notes, now):
+    """The function buckets the notes by the deadline the way the list based NoteManager did."""
+    missed_dl, today_dl, oneday_dl = [], [], []
+    for note in notes:
+        if note.status not in (NoteStatus.TERMLESS, NoteStatus.COMPLETED):
+            days = (note.issue_date - now).days
+            if days < 0:
+                missed_dl.append(note)
+            elif days == 0:
+                today_dl.append(note)
+            elif days == 1:
+                oneday_dl.append(note)
+    missed_dl.sort(key=lambda x: (x.issue_date == datetime.min, x.issue_date), reverse=True)
+    return [missed_dl, today_dl, oneday_dl]
+
+
+def measure(name, function, repeat=3):
+    """The function prints the best time of a given function call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    print(f"{name:<40} {best * 1000:10.1f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    notes = generate_notes(count)
+    now = datetime.now()
+    start, end = now - timedelta(days=30), now - timedelta(days=7)
+    print(f"{count} notes")
+    measure("columnar store build", lambda: ColumnarNoteStore(notes), 1)
+    store = ColumnarNoteStore(notes)
+    measure("urgency buckets, dataclasses", lambda: urgent_loop(notes, now))
+    measure("urgency buckets, columnar", lambda: store.urgent(now))
+    measure("created_date range, dataclasses", lambda: [x for x in notes if start <= x.created_date < end])
+    measure("created_date range, columnar", lambda: store.between("created_date", start, end))
+    measure("status counts, dataclasses", lambda: {s: sum(x.status == s for x in notes) for s in NoteStatus})
+    measure("status counts, columnar", store.status_counts)
+    measure("update and urgency buckets, columnar", lambda: (store.add(notes[0]), store.urgent(now)))
+    measure("append and urgency buckets, columnar", lambda: (store.add(generate_notes(1, perf_counter_ns())[0]),
+                                                             store.urgent(now)))
+    measure("delete and urgency buckets, columnar", lambda: (store.remove(notes.pop().id_), store.urgent(now)))
+
+
+if __name__ == "__main__":
+    main()
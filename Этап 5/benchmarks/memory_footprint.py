@@ -0,0 +1,108 @@
+"""The report compares the memory footprint of the Note dataclass and the slotted CompactNote,
+alone and kept by a NoteManager together with its indexes.
+
+Run from the project directory: python -m benchmarks.memory_footprint [number of notes]
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from uuid import UUID
+import sys
+import tempfile
+import tracemalloc
+import warnings
+from data import Note, CompactNote, NoteManager
+from utils import NoteStatus
+
+
+WORDS = ("meeting", "report", "review", "deploy", "invoice", "call", "plan", "budget", "team", "client")
+
+
+def generate_records(count, seed=0):
+    """The function generates the field tuples of a given number of random notes written by 100 users.
+    The usernames are built at runtime like the ones parsed from a file, so they aren't shared.
+    """
+    rnd = Random(seed)
+    now = datetime.now()
+    statuses = list(NoteStatus)
+    return [
+        (
+            "content",
+            now - timedelta(minutes=rnd.randrange(500000)),
+            UUID(int=rnd.getrandbits(128)),
+            now + timedelta(minutes=rnd.randrange(-10000, 10000)),
+            rnd.choice(statuses),
+            "title",
+            "".join(["user ", str(rnd.randrange(100))]),
+        )
+        for _ in range(count)
+    ]
+
+
+def footprint(note_class, records):
+    """The function return the number of bytes allocated to create the notes of a given class
+    from the given field tuples.
+    """
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    notes = [note_class(*record) for record in records]
+    allocated = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename"))
+    tracemalloc.stop()
+    return allocated, notes
+
+
+def generate_dicts(count, seed=0):
+    """The function generates the dicts of a given number of random notes as they are read from a file.
+    Every content has 20 words out of a vocabulary of 10000 ones.
+    """
+    rnd = Random(seed)
+    dicts = []
+    for note in generate_records(count, seed):
+        words = (rnd.choice(WORDS) + str(rnd.randrange(1000)) for _ in range(20))
+        dicts.append({
+            "content": " ".join(words),
+            "created_date": note[1].isoformat(),
+            "id_": str(note[2]),
+            "issue_date": note[3].isoformat(),
+            "status": note[4].name,
+            "title": note[5],
+            "username": note[6],
+        })
+    return dicts
+
+
+def manager_footprint(note_dicts, **options):
+    """The function return the number of bytes kept by a NoteManager after importing the given note dicts,
+    the notes and all the indexes of the manager are counted.
+    """
+    with tempfile.TemporaryDirectory() as directory, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        manager = NoteManager(storage_path=Path(directory) / "notes.yaml", **options)
+        tracemalloc.start()
+        manager.import_notes_from_dicts(note_dicts)
+        manager.query(limit=1)
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return allocated
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    print(f"{count} notes, the instances and the username strings they keep are counted")
+    print(f"{'class':<14} {'instance size':>14} {'total':>12} {'per note':>10}")
+    for note_class in (Note, CompactNote):
+        records = generate_records(count)
+        total, notes = footprint(note_class, records)
+        usernames = {id(note.username): note.username for note in notes}
+        total += sum(sys.getsizeof(name) for name in usernames.values())
+        instance = sys.getsizeof(notes[0]) + (sys.getsizeof(notes[0].__dict__) if hasattr(notes[0], "__dict__") else 0)
+        print(f"{note_class.__name__:<14} {instance:>12} B {total / 2 ** 20:>9.1f} MB {total / count:>8.0f} B")
+    print(f"\n{count} notes of 20 words kept by a NoteManager, the notes and all indexes are counted")
+    note_dicts = generate_dicts(count)
+    for note_class in (Note, CompactNote):
+        total = manager_footprint(note_dicts, compact_notes=note_class is CompactNote)
+        print(f"{note_class.__name__:<14} {'':>14} {total / 2 ** 20:>9.1f} MB {total / count:>8.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""The benchmark compares the compiled NoteSchema decoder, encoder and serializer with the per-record
+dict checks of the former NoteManager._from_dict() and with dataclasses.asdict().
+
+Run from the project directory: python -m benchmarks.schema_benchmark [number of notes]
+"""
+from dataclasses import asdict
+from datetime import datetime
+from uuid import UUID
+import json
+import sys
+from benchmarks.columnar_benchmark import generate_notes, measure
+from data import Note
+from data.file_io import NoteEncoder
+from data.schema import schema_for
+from utils import DataIntegrityError, NoteStatus
+
+
+def legacy_from_dict(note_dict, note_class=Note):
+    """The function converts a dict to the note the way NoteManager._from_dict() did before NoteSchema."""
+    required_fields = ("content", "created_date", "id_", "issue_date", "status", "title", "username")
+    if not all(field in note_dict for field in required_fields):
+        raise DataIntegrityError(note_dict)
+    try:
+        return note_class(
+            content=note_dict["content"],
+            created_date=datetime.fromisoformat(note_dict["created_date"]),
+            id_=UUID(note_dict["id_"]),
+            issue_date=datetime.fromisoformat(note_dict["issue_date"]),
+            status=NoteStatus[note_dict["status"]],
+            title=note_dict["title"],
+            username=note_dict["username"]
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise DataIntegrityError(e)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    notes = generate_notes(count)
+    schema = schema_for(Note)
+    raw = list(schema.serialize_all(notes))
+    print(f"{count} notes")
+    measure("decode, former _from_dict", lambda: [legacy_from_dict(d) for d in raw])
+    measure("decode, NoteSchema", lambda: [schema.decode(d) for d in raw])
+    measure("encode, dataclasses.asdict", lambda: [asdict(note) for note in notes])
+    measure("encode, NoteSchema", lambda: [schema.encode(note) for note in notes])
+    measure("JSON Lines, asdict and NoteEncoder", lambda: [json.dumps(asdict(note), cls=NoteEncoder) for note in notes])
+    measure("JSON Lines, NoteSchema.serialize", lambda: [json.dumps(d) for d in schema.serialize_all(notes)])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
-from .note import Note
+from .note import Note, CompactNote
 from .note_manager import NoteManager
-from .file_io import import_from_json, import_from_yaml, export_to_json, export_to_yaml
+from .schema import NoteSchema, schema_for
+from .columnar import ColumnarNoteStore
+from .query import And, Or, Not, StatusIs, UsernameIs, Keyword, CreatedBetween, IssueBetween
+from .file_io import import_from_json, import_from_yaml, import_from_jsonl, export_to_json, export_to_yaml, \
+    export_to_jsonl, split_jsonl, Codec, get_codec, register_codec
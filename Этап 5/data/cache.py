@@ -0,0 +1,50 @@
+from collections import OrderedDict, namedtuple
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class ResultCache:
+    """The class ResultCache represents an LRU cache of the query results.
+    Every entry is tagged with the data version it was computed for and, optionally,
+    with the moment it expires at. An entry of the other version or an expired one is a miss.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, version, moment=None):
+        """The function return a tuple (found, value) for a given key, data version
+        and, if the entry expires, the current moment.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry_version, expires, value = entry
+            if entry_version == version and (expires is None or moment < expires):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, version, value, expires=None):
+        """The function stores a value for a given key and data version
+        evicting the least recently used entry if the cache is full.
+        """
+        self._entries[key] = (version, expires, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """The function removes all entries and resets the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """The function return the CacheInfo named tuple with the cache statistics."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+from utils import NoteStatus
+from resources import strings
+from .indexes import NoteIndex
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def numpy_available():
+    """The function checks if the optional NumPy dependency is installed."""
+    return np is not None
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _datetime_column(values, count):
+    """The function packs the given datetime values to a datetime64[us] array
+    through the integer microseconds, which is much faster than converting the datetime objects.
+    """
+    return np.fromiter(((value - _EPOCH) // _MICROSECOND for value in values), np.int64, count).view("datetime64[us]")
+
+
+class ColumnarNoteStore(NoteIndex):
+    """The class ColumnarNoteStore represents a columnar copy of the notes: the created_date and
+    issue_date fields are kept as datetime64 arrays and the status as a small int array next to
+    the list of the notes. The date and status queries run as vectorized mask operations.
+
+    The store is maintained incrementally like the secondary indexes: the added notes are appended
+    to the columns on the next query, a changed note is overwritten in its row and a removed one
+    is only masked out. The rows follow the positions given by a 'position' function (the insertion
+    order by default), a row is kept for a removed note, so the note added back at the same position
+    takes it again. The columns are compacted when more than half of the rows are removed or a note
+    is added before the last row.
+    Raises an ImportError exception if NumPy isn't installed.
+    """
+    fields = ("created_date", "issue_date", "status")
+
+    def __init__(self, notes=(), position=None):
+        if np is None:
+            raise ImportError(strings.numpy_missing_str)
+        self._position = position
+        self.clear()
+        for note in notes:
+            self.add(note)
+
+    def __len__(self):
+        return len(self.notes) - self._dead
+
+    def clear(self):
+        """The function removes all notes from the store."""
+        self.notes = []
+        self._order = []
+        self._rows = {}
+        self._counter = 0
+        self._filled = 0
+        self._dead = 0
+        self._ordered = True
+        self.created_date = np.empty(0, dtype="datetime64[us]")
+        self.issue_date = np.empty(0, dtype="datetime64[us]")
+        self.status = np.empty(0, dtype=np.int8)
+        self._alive = np.empty(0, dtype=bool)
+
+    def add(self, note):
+        """The function puts a given note to the store. A note already stored at the same position
+        is overwritten in its row, otherwise the note is appended.
+        """
+        row = self._rows.get(note.id_)
+        if self._position is not None:
+            position = self._position(note.id_)
+        elif row is not None:
+            position = self._order[row]
+        else:
+            position = self._counter
+            self._counter += 1
+        if row is not None:
+            if self._order[row] == position:
+                if self.notes[row] is None:
+                    self._dead -= 1
+                self.notes[row] = note
+                if row < self._filled:
+                    self.created_date[row] = np.datetime64(note.created_date, "us")
+                    self.issue_date[row] = np.datetime64(note.issue_date, "us")
+                    self.status[row] = note.status.value
+                    self._alive[row] = True
+                return
+            self.remove(note.id_)
+        if self._order and position < self._order[-1]:
+            self._ordered = False
+        self._rows[note.id_] = len(self.notes)
+        self.notes.append(note)
+        self._order.append(position)
+
+    def remove(self, id_):
+        """The function masks out a note with a given ID keeping its row for the note added back."""
+        row = self._rows.get(id_)
+        if row is not None and self.notes[row] is not None:
+            self.notes[row] = None
+            self._dead += 1
+            if row < self._filled:
+                self._alive[row] = False
+
+    def _fill(self):
+        """The function writes the rows appended after the last query to the columns,
+        growing the columns twice when they are full.
+        """
+        start, count = self._filled, len(self.notes)
+        if start == count:
+            return
+        if count > len(self._alive):
+            capacity = max(count, 2 * len(self._alive))
+            for name in ("created_date", "issue_date", "status", "_alive"):
+                column = getattr(self, name)
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:start] = column[:start]
+                setattr(self, name, grown)
+        added = self.notes[start:]
+        alive = np.fromiter((note is not None for note in added), dtype=bool, count=len(added))
+        live = [note for note in added if note is not None]
+        rows = start + np.flatnonzero(alive)
+        self.created_date[rows] = _datetime_column((note.created_date for note in live), len(live))
+        self.issue_date[rows] = _datetime_column((note.issue_date for note in live), len(live))
+        self.status[rows] = np.fromiter((note.status.value for note in live), dtype=np.int8, count=len(live))
+        self._alive[start:count] = alive
+        self._filled = count
+
+    def _compact(self):
+        """The function rebuilds the columns from the stored notes in the position order."""
+        live = [(position, note) for position, note in zip(self._order, self.notes) if note is not None]
+        if not self._ordered:
+            live.sort(key=lambda x: x[0])
+        counter = self._counter
+        self.clear()
+        self._counter = counter
+        self._order = [position for position, _ in live]
+        self.notes = [note for _, note in live]
+        self._rows = {note.id_: row for row, note in enumerate(self.notes)}
+        self._fill()
+
+    def _ready(self):
+        """The function brings the columns up to date and returns the number of the filled rows."""
+        if not self._ordered or self._dead > len(self.notes) // 2:
+            self._compact()
+        else:
+            self._fill()
+        return self._filled
+
+    def _take(self, rows):
+        """The function return a list of notes by a given array of row numbers."""
+        return [self.notes[i] for i in rows.tolist()]
+
+    def between(self, field, start=None, end=None):
+        """The function return a list of notes with a given date field value in the range
+        from start (inclusive) to end (exclusive) in the store order. None means an open bound.
+        """
+        count = self._ready()
+        column = getattr(self, field)[:count]
+        mask = self._alive[:count].copy()
+        if start is not None:
+            mask &= column >= np.datetime64(start, "us")
+        if end is not None:
+            mask &= column < np.datetime64(end, "us")
+        return self._take(np.flatnonzero(mask))
+
+    def status_counts(self):
+        """The function return a dict with the number of notes for every NoteStatus value."""
+        count = self._ready()
+        counts = np.bincount(self.status[:count][self._alive[:count]], minlength=len(NoteStatus))
+        return {status: int(counts[status.value]) for status in NoteStatus}
+
+    def urgent(self, now):
+        """The function return three lists of notes with the missed deadline, the deadline today
+        and tomorrow counted from a given moment, ordered like NoteManager.get_urgent_notes_sorted() does.
+        """
+        count = self._ready()
+        status, issue_date = self.status[:count], self.issue_date[:count]
+        with_deadline = self._alive[:count] & (
+            (status == NoteStatus.ACTIVE.value) | (status == NoteStatus.POSTPONED.value)
+        )
+        now = np.datetime64(now, "us")
+        day = np.timedelta64(1, "D")
+        issue = issue_date.astype(np.int64)
+        missed = np.flatnonzero(with_deadline & (issue_date < now))
+        undated = issue[missed] == np.datetime64(datetime.min, "us").astype(np.int64)
+        missed = missed[np.lexsort((-issue[missed], ~undated))]
+        buckets = [missed]
+        for shift in (0, 1):
+            rows = np.flatnonzero(
+                with_deadline & (issue_date >= now + shift * day) & (issue_date < now + (shift + 1) * day)
+            )
+            buckets.append(rows[np.argsort(issue[rows], kind="stable")])
+        return [self._take(rows) for rows in buckets]
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+import lzma
+import threading
+import zlib
+
+
+_METHODS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+class CompressedContentMixin:
+    """The class CompressedContentMixin replaces the content field of a note class with a property
+    which keeps the large bodies compressed by the codec of the class and decompresses them on access.
+    """
+    __slots__ = ()
+    codec = None
+
+    @property
+    def content(self):
+        return self.codec.unpack(self._content)
+
+    @content.setter
+    def content(self, value):
+        object.__setattr__(self, "_content", self.codec.pack(value))
+
+    def __copy__(self):
+        """The function return a shallow copy of the note sharing the packed body,
+        so a copy doesn't decompress and compress the content again.
+        """
+        clone = object.__new__(type(self))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                slot = cls.__dict__[name]
+                try:
+                    slot.__set__(clone, slot.__get__(self))
+                except AttributeError:
+                    pass
+        if hasattr(self, "__dict__"):
+            clone.__dict__.update(self.__dict__)
+        return clone
+
+
+class ContentCodec:
+    """The class ContentCodec compresses the note bodies longer than a given threshold
+    with the zlib or lzma method and keeps a small LRU cache of the recently decompressed bodies.
+    The cache holds at most 'cache_size' bodies of 'cache_chars' characters in total, so the hot
+    bodies don't outweigh the saved memory. The cache is locked, so the bodies can be read
+    by the background saving thread too.
+    """
+    def __init__(self, threshold=4096, method="zlib", cache_size=32, cache_chars=256 * 1024):
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.cache_chars = cache_chars
+        self._compress, self._decompress = _METHODS[method]
+        self._hot = OrderedDict()
+        self._hot_chars = 0
+        self._lock = threading.Lock()
+
+    def note_class(self, base):
+        """The function return a subclass of a given note class with the content kept by the codec."""
+        return type("Compressed" + base.__name__, (CompressedContentMixin, base),
+                    {"__slots__": ("_content",), "codec": self})
+
+    def pack(self, text):
+        """The function return a given text as is if it's short or compressed to bytes otherwise."""
+        if len(text) < self.threshold:
+            return text
+        return self._compress(text.encode("utf-8"))
+
+    def unpack(self, packed):
+        """The function return the text of a packed body using the cache of hot bodies."""
+        if isinstance(packed, str):
+            return packed
+        with self._lock:
+            text = self._hot.get(packed)
+            if text is not None:
+                self._hot.move_to_end(packed)
+                return text
+        text = self._decompress(packed).decode("utf-8")
+        if len(text) > self.cache_chars:
+            return text
+        with self._lock:
+            if packed not in self._hot:
+                self._hot[packed] = text
+                self._hot_chars += len(text)
+            while len(self._hot) > self.cache_size or self._hot_chars > self.cache_chars:
+                self._hot_chars -= len(self._hot.popitem(last=False)[1])
+        return text
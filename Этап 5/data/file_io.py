@@ -2,19 +2,188 @@ from utils import FileIOError, NoteStatus
 from json import JSONDecodeError
 from datetime import datetime
 from enum import Enum
+from itertools import chain, islice
+from pathlib import Path
 from uuid import UUID
 import yaml
 import json
+import os
 from resources import strings
 
 
+WRITE_CHUNK_SIZE = 1024 * 1024
+YAML_BATCH_SIZE = 256
+
+
+class NoteYamlDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+    """The class NoteYamlDumper is the libyaml based safe dumper (or the pure Python one if libyaml
+    isn't installed) which writes the datetime, NoteStatus and UUID values as strings.
+    The anchors and aliases are never written, as the note values are plain scalars and the anchors
+    of the separately dumped batches of a streaming export would clash.
+    """
+    def ignore_aliases(self, data):
+        return True
+
+
+NoteYamlDumper.add_representer(
+    datetime, lambda dumper, data: dumper.represent_scalar("tag:yaml.org,2002:str", data.isoformat())
+)
+NoteYamlDumper.add_representer(
+    NoteStatus, lambda dumper, data: dumper.represent_scalar("tag:yaml.org,2002:str", data.name)
+)
+NoteYamlDumper.add_representer(
+    UUID, lambda dumper, data: dumper.represent_scalar("tag:yaml.org,2002:str", str(data))
+)
+
+
+class NoteEncoder(json.JSONEncoder):
+    """The class NoteEncoder is the JSON encoder which writes the Enum, datetime and UUID values as strings."""
+    def default(self, obj):
+        if isinstance(obj, Enum):
+            return obj.name
+        elif isinstance(obj, datetime):
+            return obj.isoformat()
+        elif isinstance(obj, UUID):
+            return str(obj)
+        else:
+            return obj
+
+
+_JSONL_ENCODER = NoteEncoder(ensure_ascii=False, separators=(",", ":"))
+_JSON_ITEM_ENCODER = NoteEncoder(indent=4, ensure_ascii=False)
+
+
+def _yaml_pieces(dicts):
+    """The function yields the YAML text of given dicts by the batches of YAML_BATCH_SIZE dicts.
+    The block sequence items are independent, so the text is the same as of the whole list dumped at once.
+    """
+    dicts = iter(dicts)
+    while batch := list(islice(dicts, YAML_BATCH_SIZE)):
+        yield yaml.dump(batch, Dumper=NoteYamlDumper, allow_unicode=True)
+
+
+def _json_pieces(dicts):
+    """The function yields the JSON array text of given dicts item by item in the same layout
+    as json.dump() with indent=4 gives. The JSON strings can't contain a raw new line,
+    so the item lines are indented by the replacement.
+    """
+    separator = "[\n    "
+    for d in dicts:
+        yield separator + _JSON_ITEM_ENCODER.encode(d).replace("\n", "\n    ")
+        separator = ",\n    "
+    yield "[]" if separator.startswith("[") else "\n]"
+
+
+def _jsonl_pieces(dicts):
+    """The function yields the JSON Lines text of given dicts line by line."""
+    for d in dicts:
+        yield _JSONL_ENCODER.encode(d) + "\n"
+
+
+def _write_chunked(file, pieces):
+    """The function writes given text pieces to an open file joining them to the chunks
+    of about WRITE_CHUNK_SIZE characters, so neither the whole text nor a write per piece is needed.
+    """
+    chunk = []
+    size = 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= WRITE_CHUNK_SIZE:
+            file.write("".join(chunk))
+            chunk.clear()
+            size = 0
+    if chunk:
+        file.write("".join(chunk))
+
+
+def _non_empty(dicts):
+    """The function return an iterator over given dicts (a list or any iterable)
+    or raises a ValueError exception if there are none.
+    """
+    dicts = iter(dicts)
+    first = next(dicts, None)
+    if first is None:
+        raise ValueError(strings.empty_list_export_str)
+    return chain((first,), dicts)
+
+
+class Codec:
+    """The class Codec represents a file format of the notes storage.
+
+    The attributes 'load' and 'dump' keep the functions reading the list of dicts from an open file
+    and writing it to an open file.
+
+    The attribute 'encode' keeps the function yielding the text of the dicts from an iterator piece by piece
+    for the streaming export, the dump of the whole list is used if it's None.
+
+    The attribute 'accelerated' tells if the codec runs on a C extension.
+    """
+    def __init__(self, name, load, dump, accelerated=False, encode=None):
+        self.name = name
+        self.load = load
+        self.dump = dump
+        self.accelerated = accelerated
+        self.encode = encode
+
+    def write(self, dicts, file):
+        """The function writes given dicts (a list or any iterable) to an open file by the chunks
+        if the codec can encode them piece by piece or dumps the whole list otherwise.
+        """
+        if self.encode is None:
+            self.dump(list(dicts), file)
+        else:
+            _write_chunked(file, self.encode(dicts))
+
+
+_CODECS = {}
+
+
+def register_codec(codec):
+    """The function adds a given Codec to the registry replacing the codec of the same name."""
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name):
+    """The function return the registered Codec of a given format name
+    or raises a ValueError exception if there's no such codec.
+    """
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(strings.unknown_codec_str + str(name))
+
+
+register_codec(Codec(
+    "yaml",
+    lambda file: yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)),
+    lambda dicts, file: yaml.dump(dicts, file, Dumper=NoteYamlDumper, allow_unicode=True),
+    hasattr(yaml, "CSafeLoader"),
+    _yaml_pieces
+))
+register_codec(Codec(
+    "jsonl",
+    lambda file: [json.loads(line) for line in file if line.strip()],
+    lambda dicts, file: file.writelines(_jsonl_pieces(dicts)),
+    True,
+    _jsonl_pieces
+))
+register_codec(Codec(
+    "json",
+    lambda file: json.load(file),
+    lambda dicts, file: json.dump(dicts, file, cls=NoteEncoder, indent=4, ensure_ascii=False),
+    True,
+    _json_pieces
+))
+
+
 def import_from_yaml(filename):
     """The function handles YAML file IO and returns read model as the list of dicts.
     Raises FileIOError if file reading or parsing fails.
     """
     try:
         with open(filename, 'r', encoding='utf-8') as file:
-            dicts = yaml.safe_load(file)
+            dicts = get_codec("yaml").load(file)
         if not dicts:
             raise FileIOError(strings.file_str + str(filename) + strings.is_empty_str)
         return dicts
@@ -23,24 +192,15 @@ def import_from_yaml(filename):
 
 
 def export_to_yaml(dicts, filename, rewrite=True):
-    """The function handles YAML file IO and dumps given dicts to a given filename.
+    """The function handles YAML file IO and dumps given dicts (a list or any iterable) to a given filename.
+    The dicts are written as they come by the buffered chunks, so the whole document is never built in memory.
     If rewrite=False the function appends model to a given file.
     Raises FileIOError if file writing or conversion fails.
     """
-    def datetime_representer(dumper, data):
-        return dumper.represent_scalar("tag:yaml.org,2002:str", data.isoformat())
-    def enum_representer(dumper, data):
-        return dumper.represent_scalar("tag:yaml.org,2002:str", data.name)
-    def uuid_representer(dumper, data):
-        return dumper.represent_scalar("tag:yaml.org,2002:str", str(data))
-    if not dicts:
-        raise ValueError(strings.empty_list_export_str)
+    dicts = _non_empty(dicts)
     try:
-        yaml.add_representer(datetime, datetime_representer)
-        yaml.add_representer(NoteStatus, enum_representer)
-        yaml.add_representer(UUID, uuid_representer)
         with open(filename, 'w' if rewrite else 'a', encoding='utf-8') as file:
-            yaml.dump(dicts, file, allow_unicode=True)
+            get_codec("yaml").write(dicts, file)
     except (OSError, ValueError, yaml.YAMLError) as e:
         raise FileIOError(strings.yaml_export_failed_str + str(e))
 
@@ -51,7 +211,7 @@ def import_from_json(filename):
     """
     try:
         with open(filename) as file:
-            dicts = json.load(file)
+            dicts = get_codec("json").load(file)
         if not dicts:
             raise FileIOError(strings.file_str + str(filename) + strings.is_empty_str)
         return dicts
@@ -60,24 +220,104 @@ def import_from_json(filename):
 
 
 def export_to_json(dicts, filename, rewrite=True):
-    """The function handles JSON file IO and dumps given dicts to a given filename.
+    """The function handles JSON file IO and dumps given dicts (a list or any iterable) to a given filename.
+    The dicts are written as they come by the buffered chunks, so the whole document is never built in memory.
     If rewrite=False the function appends model to a given file.
     Raises FileIOError if file writing or conversion fails.
     """
-    class NoteEncoder(json.JSONEncoder):
-        def default(self, obj):
-            if isinstance(obj, Enum):
-                return obj.name
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            elif isinstance(obj, UUID):
-                return str(obj)
-            else:
-                return obj
-    if not dicts:
-        raise ValueError(strings.empty_list_export_str)
+    dicts = _non_empty(dicts)
     try:
         with open(filename, 'w' if rewrite else 'a', encoding='utf-8') as file:
-            json.dump(dicts, file, cls=NoteEncoder, indent=4, ensure_ascii=False) # type: ignore
+            get_codec("json").write(dicts, file)
     except (ValueError, OSError) as e:
         raise FileIOError(strings.json_export_failed_str + str(e))
+
+
+def import_from_jsonl(filename, start=0, end=None):
+    """The function handles JSON Lines file IO and yields the dicts read from the file one by one,
+    so the whole file is never kept in memory. The empty lines are skipped.
+
+    The arguments 'start' and 'end' take the byte offsets of the file part to read, the part
+    includes the lines starting from start (inclusive) to end (exclusive). The offsets given by
+    split_jsonl() let the parts be parsed in parallel.
+
+    Raises FileIOError if file reading or parsing fails or if the whole file is empty.
+    """
+    count = 0
+    try:
+        with open(filename, 'rb') as file:
+            file.seek(start)
+            position = start
+            for line in file:
+                if end is not None and position >= end:
+                    break
+                position += len(line)
+                if line.strip():
+                    yield json.loads(line)
+                    count += 1
+    except (OSError, ValueError) as e:
+        raise FileIOError(strings.json_import_failed_str + str(filename) + ": " + str(e))
+    if not count and start == 0 and end is None:
+        raise FileIOError(strings.file_str + str(filename) + strings.is_empty_str)
+
+
+def export_to_jsonl(dicts, filename, rewrite=True):
+    """The function handles JSON Lines file IO and dumps given dicts (a list or any iterable)
+    to a given filename one per line by the buffered chunks. If rewrite=False the function appends the lines
+    to a given file without reading it. Raises FileIOError if file writing or conversion fails.
+    """
+    dicts = _non_empty(dicts)
+    try:
+        with open(filename, 'w' if rewrite else 'a', encoding='utf-8') as file:
+            get_codec("jsonl").write(dicts, file)
+    except (ValueError, TypeError, OSError) as e:
+        raise FileIOError(strings.json_export_failed_str + str(e))
+
+
+def split_jsonl(filename, parts):
+    """The function splits a JSON Lines file to the given number of parts of about the same size
+    at the line boundaries and returns a list of the (start, end) byte offsets of the non-empty parts
+    to be read by import_from_jsonl(). Raises FileIOError if file reading fails.
+    """
+    try:
+        size = os.path.getsize(filename)
+        bounds = [0]
+        with open(filename, 'rb') as file:
+            for i in range(1, parts):
+                offset = max(size * i // parts, bounds[-1], 1)
+                if offset >= size:
+                    break
+                file.seek(offset - 1)
+                file.readline()
+                bounds.append(file.tell())
+        bounds.append(size)
+    except OSError as e:
+        raise FileIOError(strings.json_import_failed_str + str(filename) + ": " + str(e))
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def export_atomically(export, dicts, filename):
+    """The function dumps given dicts (a list or any iterable) to a given filename with a given export function
+    (export_to_yaml, export_to_json or export_to_jsonl) through a temporary file which is synced to the disk
+    and renamed over the target, so the file is never left half-written, even if the dicts fail to be made
+    while they are written. No dicts empty the file. The temporary file is removed if writing fails.
+    Raises FileIOError if file writing or conversion fails.
+    """
+    temp_path = Path(str(filename) + ".tmp")
+    try:
+        dicts = _non_empty(dicts)
+    except ValueError:
+        dicts = None
+    try:
+        if dicts is not None:
+            export(dicts, temp_path)
+        else:
+            with open(temp_path, 'w'):
+                pass
+        with open(temp_path, 'rb+') as file:
+            os.fsync(file.fileno())
+        os.replace(temp_path, filename)
+    except OSError as e:
+        raise FileIOError(strings.file_str + str(filename) + ": " + str(e))
+    finally:
+        temp_path.unlink(missing_ok=True)
@@ -0,0 +1,489 @@
+from array import array
+from bisect import bisect_left, insort
+from math import inf
+from utils import NoteStatus
+import re
+
+
+TEXT_FIELDS = ("username", "title", "content")
+BULK_SIZE = 512
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """The function splits a given text to the set of unique lowercase word tokens."""
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+def short_grams(token):
+    """The function return a set of all one and two characters long substrings of a given token."""
+    return {token[i:i + n] for n in (1, 2) for i in range(len(token) - n + 1)}
+
+
+class NoteIndex:
+    """The class NoteIndex is a base class of the secondary indexes maintained by the NoteManager.
+    An index keeps by itself what it needs to remove a note by the ID, so a note can be changed
+    in place and reindexed afterwards.
+    """
+    fields = ()
+
+    def update(self, note, changed):
+        """The function reindexes a given note after the fields with the given names were changed in place."""
+        self.remove(note.id_)
+        self.add(note)
+
+
+def _intersect(numbers, posting):
+    """The function return the numbers of a given set which are found in a given ascending posting array.
+    A posting much longer than the set is looked up by a binary search instead of the scanning.
+    """
+    if len(posting) <= 16 * len(numbers):
+        return numbers.intersection(posting)
+    found = set()
+    for number in numbers:
+        i = bisect_left(posting, number)
+        if i < len(posting) and posting[i] == number:
+            found.add(number)
+    return found
+
+
+class _TextIndex(NoteIndex):
+    """The class _TextIndex is a base class of the indexes which map the terms of the username,
+    title and content fields to the notes containing them. Every indexed field value gets a number
+    and the postings keep the numbers in the ascending arrays, so neither the notes nor their terms
+    are kept by the index. A removed or changed field value only marks its number as dead, the dead
+    numbers are dropped from the postings by a single pass once they make a half of all numbers.
+    A note changed in place is reindexed by the changed fields only.
+    """
+    fields = TEXT_FIELDS
+
+    def __init__(self):
+        self._postings = {}
+        self._owners = []
+        self._numbers = {}
+        self._dead = 0
+
+    def _terms(self, text):
+        """The function return a set of the terms of a given field value."""
+        raise NotImplementedError
+
+    def _term_added(self, term):
+        """The function is called when a new term gets to the index."""
+
+    def _term_dropped(self, term):
+        """The function is called when a term is dropped from the index."""
+
+    def _add_field(self, id_, text):
+        """The function adds the terms of a field value of a note with a given ID and returns the number of the value."""
+        number = len(self._owners)
+        self._owners.append(id_)
+        for term in self._terms(text):
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = array("I")
+                self._term_added(term)
+            posting.append(number)
+        return number
+
+    def add(self, note):
+        """The function adds the terms of the text fields of a given note to the index."""
+        self._numbers[note.id_] = [self._add_field(note.id_, getattr(note, field)) for field in TEXT_FIELDS]
+
+    def update(self, note, changed):
+        """The function reindexes the text fields with the given names of a note changed in place."""
+        numbers = self._numbers.get(note.id_)
+        if numbers is None:
+            self.add(note)
+            return
+        for i, field in enumerate(TEXT_FIELDS):
+            if field in changed:
+                self._owners[numbers[i]] = None
+                self._dead += 1
+                numbers[i] = self._add_field(note.id_, getattr(note, field))
+        self._collect()
+
+    def remove(self, id_):
+        """The function removes a note with a given ID from the index."""
+        numbers = self._numbers.pop(id_, None)
+        if numbers is None:
+            return
+        for number in numbers:
+            self._owners[number] = None
+        self._dead += len(numbers)
+        self._collect()
+
+    def clear(self):
+        """The function removes all notes from the index."""
+        self._postings.clear()
+        self._owners.clear()
+        self._numbers.clear()
+        self._dead = 0
+
+    def _collect(self):
+        """The function drops the dead numbers from the postings and renumbers the live ones
+        if the dead numbers make a half of all numbers.
+        """
+        owners = self._owners
+        if self._dead <= max(BULK_SIZE, len(owners) // 2):
+            return
+        renumbered = [0] * len(owners)
+        live = []
+        for number, owner in enumerate(owners):
+            if owner is not None:
+                renumbered[number] = len(live)
+                live.append(owner)
+        for term, posting in list(self._postings.items()):
+            kept = array("I", [renumbered[number] for number in posting if owners[number] is not None])
+            if kept:
+                self._postings[term] = kept
+            else:
+                del self._postings[term]
+                self._term_dropped(term)
+        for numbers in self._numbers.values():
+            numbers[:] = [renumbered[number] for number in numbers]
+        self._owners = live
+        self._dead = 0
+
+    def _ids(self, numbers):
+        """The function return a set of IDs of the notes owning the live field values with the given numbers."""
+        owners = self._owners
+        ids = {owners[number] for number in numbers}
+        ids.discard(None)
+        return ids
+
+
+class KeywordIndex(_TextIndex):
+    """The class KeywordIndex represents an inverted index which maps the lowercase
+    word tokens of the username, title and content fields to the notes containing them.
+    The index is maintained incrementally by the NoteManager.
+    The vocabulary tokens containing a one or two characters long gram are collected by a single
+    vocabulary scan when the gram is searched for the first time and kept up to date afterwards,
+    so the repeated searches look them up without scanning the vocabulary.
+    """
+    def __init__(self):
+        super().__init__()
+        self._grams = {}
+
+    def _terms(self, text):
+        return tokenize(text)
+
+    def _term_added(self, term):
+        self._update_grams(term, set.add)
+
+    def _term_dropped(self, term):
+        self._update_grams(term, set.discard)
+
+    def clear(self):
+        """The function removes all notes from the index."""
+        super().clear()
+        self._grams.clear()
+
+    def _update_grams(self, token, change):
+        """The function applies a given set method to the collected token sets of the grams of a given token."""
+        if self._grams:
+            for gram in short_grams(token):
+                tokens = self._grams.get(gram)
+                if tokens is not None:
+                    change(tokens, token)
+
+    def _matching(self, key_token):
+        """The function return the vocabulary tokens containing a given key token."""
+        gram = key_token[:2]
+        tokens = self._grams.get(gram)
+        if tokens is None:
+            tokens = self._grams[gram] = {token for token in self._postings if gram in token}
+        return tokens if len(key_token) <= 2 else [token for token in tokens if key_token in token]
+
+    def estimate(self, key):
+        """The function return the upper bound of the number of candidates() for a given lowercase key
+        or None if the index can't narrow the search.
+        """
+        key_tokens = set(_TOKEN_RE.findall(key))
+        if not key_tokens:
+            return None
+        return min(sum(len(self._postings[token]) for token in self._matching(key_token)) for key_token in key_tokens)
+
+    def candidates(self, key):
+        """The function return a set of IDs of the notes which may contain a given lowercase key
+        as a substring of one of the text fields. Every word token of the key must be a part of
+        some token of the same field, so only the vocabulary tokens containing it are looked at, not the notes text.
+        If the key has no word characters the function return None, which means that
+        the index can't narrow the search.
+        """
+        key_tokens = set(_TOKEN_RE.findall(key))
+        if not key_tokens:
+            return None
+        found = None
+        for key_token in key_tokens:
+            numbers = set()
+            for token in self._matching(key_token):
+                numbers.update(self._postings[token])
+            found = numbers if found is None else found & numbers
+            if not found:
+                break
+        return self._ids(found)
+
+
+def trigrams(text):
+    """The function return a set of all three characters long substrings of a given text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex(_TextIndex):
+    """The class TrigramIndex represents an index which maps every trigram of the lowercase
+    username, title and content fields to the notes containing it. A field which contains a key
+    as a substring contains all trigrams of that key, so intersecting the postings gives a small set
+    of candidates without changing the substring semantics.
+    """
+    min_key_length = 3
+
+    def _terms(self, text):
+        return trigrams(text.lower())
+
+    def estimate(self, key):
+        """The function return the upper bound of the number of candidates() for a given lowercase key,
+        which is the size of its rarest trigram posting, or None if the key is shorter than three characters.
+        """
+        if len(key) < self.min_key_length:
+            return None
+        return min(len(self._postings.get(gram, ())) for gram in trigrams(key))
+
+    def candidates(self, key):
+        """The function return a set of IDs of the notes with a field containing all trigrams of a given
+        lowercase key or None if the key is shorter than three characters.
+        """
+        if len(key) < self.min_key_length:
+            return None
+        postings = []
+        for gram in trigrams(key):
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            found = _intersect(found, posting)
+            if not found:
+                break
+        return self._ids(found)
+
+
+class StatusIndex(NoteIndex):
+    """The class StatusIndex represents a secondary index which keeps
+    the IDs of the notes grouped by their NoteStatus value.
+    """
+    fields = ("status",)
+
+    def __init__(self):
+        self._members = {}
+        self._note_status = {}
+
+    def add(self, note):
+        """The function adds a given note to the group of its status."""
+        self._note_status[note.id_] = note.status
+        self._members.setdefault(note.status, set()).add(note.id_)
+
+    def remove(self, id_):
+        """The function removes a note with a given ID from the group of its status."""
+        status = self._note_status.pop(id_, None)
+        if status is not None:
+            self._members[status].discard(id_)
+
+    def clear(self):
+        """The function removes all notes from the index."""
+        self._members.clear()
+        self._note_status.clear()
+
+    def candidates(self, status):
+        """The function return a set of IDs of the notes with a given status."""
+        return self._members.get(status, set())
+
+    def pop(self, status):
+        """The function removes the whole group of a given status and returns its IDs."""
+        members = self._members.pop(status, set())
+        for id_ in members:
+            del self._note_status[id_]
+        return members
+
+
+class _SortedEntries(NoteIndex):
+    """The class _SortedEntries is a base class of the indexes which keep a list of the (key, position, ID)
+    entries sorted by the key. The notes with equal keys are ordered by a given 'position' function
+    (the insertion order by default). The added and removed entries are collected and applied on the next read:
+    a few of them are inserted or deleted by a binary search, while a bulk of them (like the loaded notes or
+    the notes changed in a batch) is merged by a single sort or filtering pass.
+    """
+    def __init__(self, position=None):
+        self._position = position
+        self._entries = []
+        self._keys = {}
+        self._added = {}
+        self._removed = {}
+        self._counter = 0
+
+    def _insert(self, key, id_):
+        """The function collects the entry of a note with a given key and ID to be inserted on the next read."""
+        key = (key, self._counter if self._position is None else self._position(id_))
+        self._counter += 1
+        self._keys[id_] = key
+        self._added[id_] = key + (id_,)
+
+    def remove(self, id_):
+        """The function removes a note with a given ID from the index. The entry collected to be inserted
+        is just dropped, so a note changed in place is reindexed without applying the collected entries.
+        """
+        key = self._keys.pop(id_, None)
+        if key is not None and self._added.pop(id_, None) is None:
+            self._removed[id_] = key
+
+    def clear(self):
+        """The function removes all notes from the index."""
+        self._entries.clear()
+        self._keys.clear()
+        self._added.clear()
+        self._removed.clear()
+
+    def _settle(self):
+        """The function applies the collected entries to the sorted list."""
+        entries = self._entries
+        if self._removed:
+            if len(self._removed) > min(BULK_SIZE, len(entries) // 2):
+                removed = self._removed
+                entries[:] = [entry for entry in entries if entry[2] not in removed]
+            else:
+                for key in self._removed.values():
+                    del entries[bisect_left(entries, key)]
+            self._removed.clear()
+        if self._added:
+            if len(self._added) > min(BULK_SIZE, len(entries)):
+                entries.extend(self._added.values())
+                entries.sort()
+            else:
+                for entry in self._added.values():
+                    insort(entries, entry)
+            self._added.clear()
+
+
+class DeadlineIndex(_SortedEntries):
+    """The class DeadlineIndex represents a secondary index which keeps the IDs of the notes
+    with a deadline (ACTIVE and POSTPONED ones) sorted by the issue_date, so the notes
+    with a deadline in a given time range are found with a binary search.
+    The notes with the same deadline are ordered by a given 'position' function (the insertion
+    order by default).
+    """
+    fields = ("status", "issue_date")
+    statuses = (NoteStatus.ACTIVE, NoteStatus.POSTPONED)
+
+    def add(self, note):
+        """The function adds a given note to the index if the note has a deadline."""
+        if note.status in self.statuses:
+            self._insert(note.issue_date, note.id_)
+
+    def between(self, start, end):
+        """The function return a list of IDs of the notes with the deadline in the range
+        from start (inclusive) to end (exclusive) sorted by the deadline ascending.
+        """
+        self._settle()
+        lo = bisect_left(self._entries, (start,))
+        hi = bisect_left(self._entries, (end,), lo)
+        return [entry[2] for entry in self._entries[lo:hi]]
+
+    def first_after(self, moment):
+        """The function return the earliest deadline which is not before a given moment or None."""
+        self._settle()
+        i = bisect_left(self._entries, (moment,))
+        return self._entries[i][0] if i < len(self._entries) else None
+
+
+class SortedView(_SortedEntries):
+    """The class SortedView represents a persistent ordered view of the notes
+    sorted by a given key function. The view is maintained incrementally,
+    so it can be iterated in both directions without re-sorting. The notes with equal keys
+    are ordered by a given 'position' function (the insertion order by default).
+    """
+    def __init__(self, key, fields, position=None):
+        super().__init__(position)
+        self.key = key
+        self.fields = fields
+
+    def __len__(self):
+        self._settle()
+        return len(self._entries)
+
+    def add(self, note):
+        """The function inserts a given note to the view."""
+        self._insert(self.key(note), note.id_)
+
+    def between(self, start=None, end=None):
+        """The function return a list of IDs of the notes with the view key in the range from
+        start (inclusive) to end (exclusive) in the view order. None means an open bound.
+        """
+        self._settle()
+        lo = 0 if start is None else bisect_left(self._entries, (start,))
+        hi = len(self._entries) if end is None else bisect_left(self._entries, (end,), lo)
+        return [entry[2] for entry in self._entries[lo:hi]]
+
+    def ids(self, descending=False, start=0, stop=None):
+        """The function yields the IDs of the notes in the view order or in the reversed one.
+        The reversed order keeps the notes with equal keys in the insertion order like sorted(reverse=True) does.
+        The arguments 'start' and 'stop' take the bounds of a slice counted in the chosen direction.
+        """
+        self._settle()
+        entries = self._entries
+        total = len(entries)
+        stop = total if stop is None else min(stop, total)
+        if start >= stop:
+            return
+        if not descending:
+            for entry in entries[start:stop]:
+                yield entry[2]
+            return
+        key = entries[total - 1 - start][0]
+        lo = bisect_left(entries, (key,))
+        hi = bisect_left(entries, (key, inf), lo)
+        i = lo + start - (total - hi)
+        count = stop - start
+        while True:
+            for entry in entries[i:min(hi, i + count)]:
+                yield entry[2]
+            count -= hi - i
+            if count <= 0 or lo == 0:
+                return
+            hi = lo
+            lo = i = bisect_left(entries, (entries[hi - 1][0],), 0, hi)
+
+
+class UsernameIndex(NoteIndex):
+    """The class UsernameIndex represents a secondary index which keeps
+    the IDs of the notes grouped by the lowercase username.
+    """
+    fields = ("username",)
+
+    def __init__(self):
+        self._members = {}
+        self._note_keys = {}
+
+    def add(self, note):
+        """The function adds a given note to the group of its username."""
+        key = note.username.lower()
+        self._note_keys[note.id_] = key
+        self._members.setdefault(key, set()).add(note.id_)
+
+    def remove(self, id_):
+        """The function removes a note with a given ID from the group of its username."""
+        key = self._note_keys.pop(id_, None)
+        if key is not None:
+            members = self._members[key]
+            members.discard(id_)
+            if not members:
+                del self._members[key]
+
+    def clear(self):
+        """The function removes all notes from the index."""
+        self._members.clear()
+        self._note_keys.clear()
+
+    def candidates(self, username):
+        """The function return a set of IDs of the notes with a given lowercase username."""
+        return self._members.get(username, set())
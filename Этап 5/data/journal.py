@@ -0,0 +1,109 @@
+from utils import DataIntegrityError, FileIOError, NoteStatus
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from uuid import UUID
+import json
+import os
+from resources import strings
+
+
+_DECODERS = {
+    "created_date": datetime.fromisoformat,
+    "issue_date": datetime.fromisoformat,
+    "id_": UUID,
+    "status": lambda x: NoteStatus[x],
+}
+
+
+def encode_fields(fields):
+    """The function converts the note field values of a given dict to the JSON compatible ones."""
+    encoded = {}
+    for name, value in fields.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Enum):
+            value = value.name
+        elif isinstance(value, UUID):
+            value = str(value)
+        encoded[name] = value
+    return encoded
+
+
+def decode_fields(fields):
+    """The function converts the JSON values of a given dict of note fields back to the note field values.
+    Raises DataIntegrityError if conversion fails.
+    """
+    try:
+        return {name: _DECODERS[name](value) if name in _DECODERS else value for name, value in fields.items()}
+    except (ValueError, KeyError, TypeError) as e:
+        raise DataIntegrityError(strings.data_fmt_err_str + str(fields) + ": " + str(e))
+
+
+class NoteJournal:
+    """The class NoteJournal represents an append-only log of the note changes kept next to
+    the snapshot file. Every add, update or delete is written as one JSON line, so a single
+    edit costs O(1) instead of rewriting the whole snapshot. During the compaction the log
+    is rotated to the '.old' file, which is removed as soon as the new snapshot is written.
+    """
+    def __init__(self, snapshot_path):
+        self.path = Path(str(snapshot_path) + ".journal")
+        self.rotated_path = Path(str(self.path) + ".old")
+        self.size = self.path.stat().st_size if self.path.is_file() else 0
+
+    def append(self, *records):
+        """The function appends the given records to the log. Every record is a dict
+        with the 'op' key naming the operation. Raises FileIOError if writing fails.
+        """
+        data = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+        try:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(data)
+        except OSError as e:
+            raise FileIOError(strings.journal_failed_str + str(e))
+        self.size += len(data.encode('utf-8'))
+
+    def replay(self):
+        """The function yields the records of the rotated log left by an interrupted compaction
+        and of the current log in the order they were written. A torn last line is skipped.
+        Raises DataIntegrityError if a record in the middle of the log is broken
+        and FileIOError if reading fails.
+        """
+        for path in (self.rotated_path, self.path):
+            if not path.is_file():
+                continue
+            try:
+                with open(path, encoding='utf-8') as file:
+                    lines = file.readlines()
+            except OSError as e:
+                raise FileIOError(strings.journal_failed_str + str(e))
+            for i, line in enumerate(lines):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    if i == len(lines) - 1 and not line.endswith("\n"):
+                        break
+                    raise DataIntegrityError(strings.data_fmt_err_str + line + ": " + str(e))
+
+    def rotate(self):
+        """The function moves the current log aside before the compaction, so the new records
+        go to a fresh log while the snapshot is written. If the rotated log of a failed compaction
+        is still there, the current log is appended to it. Raises FileIOError if renaming fails.
+        """
+        try:
+            if self.path.is_file() and self.rotated_path.is_file():
+                with open(self.path, 'rb') as source, open(self.rotated_path, 'ab') as target:
+                    target.write(source.read())
+                self.path.unlink()
+            elif self.path.is_file():
+                os.replace(self.path, self.rotated_path)
+        except OSError as e:
+            raise FileIOError(strings.journal_failed_str + str(e))
+        self.size = 0
+
+    def drop_rotated(self):
+        """The function removes the rotated log once its records are in the snapshot."""
+        try:
+            self.rotated_path.unlink(missing_ok=True)
+        except OSError as e:
+            raise FileIOError(strings.journal_failed_str + str(e))
@@ -0,0 +1,56 @@
+from utils import DataIntegrityError, NoteStatus
+from datetime import datetime
+from uuid import UUID
+from resources import strings
+
+
+class LazyField:
+    """The class LazyField represents a note field which keeps the raw serialized value
+    until the first access, then decodes it once and keeps the decoded value.
+    A value which is already of the field type is kept as is.
+    """
+    def __init__(self, kind, decode):
+        self.kind = kind
+        self.decode = decode
+        self.name = None
+        self.private_name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = getattr(instance, self.private_name)
+        if isinstance(value, self.kind):
+            return value
+        try:
+            decoded = self.decode(value)
+        except (ValueError, KeyError, TypeError) as e:
+            raise DataIntegrityError(strings.data_fmt_err_str + f"{self.name}={value!r}: " + str(e))
+        object.__setattr__(instance, self.private_name, decoded)
+        return decoded
+
+    def __set__(self, instance, value):
+        object.__setattr__(instance, self.private_name, value)
+
+
+class LazyFieldsMixin:
+    """The class LazyFieldsMixin replaces the created_date, id_, issue_date and status fields
+    of a note class with the LazyField descriptors, so NoteManager._from_dict() can pass
+    the raw strings and the parsing is done only for the fields which are read.
+    A broken value raises DataIntegrityError on the first access to the field.
+    """
+    __slots__ = ()
+    lazy_fields = True
+    created_date = LazyField(datetime, datetime.fromisoformat)
+    id_ = LazyField(UUID, UUID)
+    issue_date = LazyField(datetime, datetime.fromisoformat)
+    status = LazyField(NoteStatus, lambda x: NoteStatus[x])
+
+
+def lazy_note_class(base):
+    """The function return a subclass of a given note class with the lazily decoded fields."""
+    return type("Lazy" + base.__name__, (LazyFieldsMixin, base),
+                {"__slots__": ("_created_date", "_id_", "_issue_date", "_status")})
@@ -2,6 +2,7 @@ from utils import NoteStatus
 from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
+import sys
 
 
 @dataclass
@@ -14,3 +15,25 @@ class Note:
     status: NoteStatus
     title: str
     username: str
+
+
+@dataclass(slots=True)
+class CompactNote:
+    """The class CompactNote represents the same note record as the Note class does
+    without the per-instance __dict__. The username is interned, so the notes of the same
+    user share a single string. The status keeps a reference to the NoteStatus member, which
+    is a singleton just like a small int is. The class is a dataclass, so dataclasses.asdict()
+    gives the same dicts as for the Note class.
+    """
+    content: str
+    created_date: datetime
+    id_: UUID
+    issue_date: datetime
+    status: NoteStatus
+    title: str
+    username: str
+
+    def __setattr__(self, name, value):
+        if name == "username":
+            value = sys.intern(value)
+        object.__setattr__(self, name, value)
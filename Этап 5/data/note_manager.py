@@ -1,49 +1,149 @@
 from utils import DataIntegrityError, NoteStatus, FileIOError
-from .file_io import export_to_yaml, import_from_yaml, export_to_json
-from .note import Note
-from dataclasses import asdict
-from datetime import datetime
+from .file_io import export_to_yaml, import_from_yaml, export_to_json, export_to_jsonl, import_from_jsonl, \
+    export_atomically
+from .note import Note, CompactNote
+from .indexes import KeywordIndex, TrigramIndex, StatusIndex, DeadlineIndex, SortedView, UsernameIndex
+from .query import And, Or, Keyword, StatusIs, CreatedBetween, IssueBetween, plan_query
+from .cache import ResultCache
+from .columnar import ColumnarNoteStore, numpy_available
+from .compression import ContentCodec
+from .lazy import lazy_note_class
+from .schema import schema_for
+from .journal import NoteJournal, encode_fields, decode_fields
+from .persister import WriteBehindPersister, NoteSnapshot
+from .snapshot_cache import SnapshotCache
+from contextlib import contextmanager
+from dataclasses import fields
+from datetime import datetime, timedelta
+from itertools import groupby
 from pathlib import Path
 from uuid import UUID
+import heapq
+import threading
 import warnings
+import weakref
 from resources import strings
 
 
+RESULT_CACHE_SIZE = 128
+STORAGE_FORMATS = ("yaml", "jsonl")
+JOURNAL_COMPACT_SIZE = 1024 * 1024
+_ORDER_KEYS = {
+    "created_date": lambda x: x.created_date,
+    "issue_date": lambda x: (x.issue_date == datetime.min, x.issue_date),
+    "title": lambda x: x.title.lower(),
+    "username": lambda x: x.username.lower(),
+}
+
+
 class NoteManager:
     """The NoteManager class represents a business-logic model
     handling the notes adding, storing, sorting, filtering,
     removing and the import/export routines.
     """
-    def __init__(self):
-        self._notes = []
-        self.storage_path = Path("notes.yaml")
+    def __init__(self, columnar=False, compact_notes=False, compress_content=False, journaled=False,
+                 write_behind=False, snapshot_cache=False, storage_format="yaml", lazy_notes=False, storage_path=None):
+        """If columnar is True, the date and status queries run over a NumPy columnar copy of the notes
+        updated incrementally like the indexes. The option is ignored with a warning if NumPy isn't installed.
+
+        If compact_notes is True, the notes are stored as the slotted CompactNote objects.
+
+        If compress_content is True, the note bodies longer than the ContentCodec threshold
+        are kept compressed in memory and decompressed on access.
+
+        If journaled is True, every change is appended to the journal file next to the file storage
+        instead of rewriting the whole file. The journal is folded into the file storage by a background
+        compaction when it grows over JOURNAL_COMPACT_SIZE bytes.
+
+        If write_behind is True and the journal is off, the saves to the file storage run on a background
+        thread of the WriteBehindPersister, which coalesces a burst of changes into one atomic write.
+        The flush() function waits for the scheduled save.
+
+        If snapshot_cache is True, the parsed notes are kept in the JSON SnapshotCache file next to
+        the file storage, which is refreshed on every save and loaded instead of parsing the file when it's fresh.
+        The notes appended to the file storage leave the cache stale until the next save or close().
+
+        The argument 'storage_format' takes one of the STORAGE_FORMATS: the 'yaml' file storage
+        is notes.yaml and the 'jsonl' one is notes.jsonl with one note per line, which is read as a stream
+        and appended to without reading it. Raises a ValueError exception if the format is unknown.
+        The argument 'storage_path' takes the path of the file storage to use instead of the default one.
+
+        If lazy_notes is True, the loaded notes keep the raw date, status and ID strings and parse
+        each of them on the first access, and the secondary indexes are built on the first query.
+        A broken value raises DataIntegrityError when it's first read instead of during the loading,
+        the note with it is dropped with a warning when the indexes are built on the first query or save.
+        """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(strings.unknown_codec_str + str(storage_format))
+        self.note_class = CompactNote if compact_notes else Note
+        self.content_codec = ContentCodec() if compress_content else None
+        if self.content_codec is not None:
+            self.note_class = self.content_codec.note_class(self.note_class)
+        if lazy_notes:
+            self.note_class = lazy_note_class(self.note_class)
+        self.lazy_notes = lazy_notes
+        self._schema = schema_for(self.note_class)
+        self._deferred_indexing = False
+        if columnar and not numpy_available():
+            warnings.warn(strings.numpy_missing_str)
+        self.columnar = columnar and numpy_available()
+        position = self._get_note_index_by_id
+        self._columnar_store = ColumnarNoteStore(position=position) if self.columnar else None
+        self._notes = {}
+        self._positions = {}
+        self._next_position = 0
+        self._keyword_index = KeywordIndex()
+        self._trigram_index = TrigramIndex()
+        self._status_index = StatusIndex()
+        self._username_index = UsernameIndex()
+        self._deadline_index = DeadlineIndex(position)
+        self._created_view = SortedView(lambda x: x.created_date, ("created_date",), position)
+        self._issue_view = SortedView(lambda x: (x.issue_date == datetime.min, x.issue_date), ("issue_date",), position)
+        self._indexes = (
+            self._keyword_index, self._trigram_index, self._status_index, self._username_index,
+            self._deadline_index, self._created_view, self._issue_view
+        ) + ((self._columnar_store,) if self.columnar else ())
+        self._query_indexes = {
+            "keyword": self._keyword_index,
+            "trigram": self._trigram_index,
+            "status": self._status_index,
+            "username": self._username_index,
+            "created_date": self._created_view,
+            "issue_date": self._issue_view,
+        }
+        self._views = {"created_date": self._created_view, "issue_date": self._issue_view}
+        self._version = 0
+        self._cache = ResultCache(RESULT_CACHE_SIZE)
+        self._batch_depth = 0
+        self._pending = {}
+        self._undo = {}
+        self._dirty_ids = set()
+        self.journaled = journaled
+        self._journal = None
+        self._compaction = None
+        self._persister = WriteBehindPersister() if write_behind and not journaled else None
+        self._snapshots = weakref.WeakSet()
+        self.snapshot_cache = snapshot_cache
+        self._cache_stale = False
+        self.storage_format = storage_format
+        self.storage_path = Path("notes." + storage_format if storage_path is None else storage_path)
         self.load_notes_from_file()
 
     def __str__(self):
-        return self._notes.__str__()
+        return list(self._notes.values()).__str__()
+
+    def __len__(self):
+        return len(self._notes)
 
     @staticmethod
-    def _from_dict(note_dict):
+    def _from_dict(note_dict, note_class=Note):
         """The function converts dictionary loaded from JSON or
-        YAML file to the Note class object and returns it.
+        YAML file to the Note class object (or a given note_class one) and returns it.
+        A note class with the lazy fields gets the raw values, which are parsed on the first access.
+        The conversion is done by the compiled NoteSchema of the note class.
         Raises DataIntegrityError if conversion fails.
         """
-        required_fields = ("content", "created_date", "id_", "issue_date", "status", "title", "username")
-        if not all(field in note_dict for field in required_fields):
-            raise DataIntegrityError(strings.missing_fields_str + str(note_dict))
-        try:
-            note = Note(
-                content=note_dict["content"],
-                created_date=datetime.fromisoformat(note_dict["created_date"]),
-                id_=UUID(note_dict["id_"]),
-                issue_date=datetime.fromisoformat(note_dict["issue_date"]),
-                status=NoteStatus[note_dict["status"]], # noqa
-                title=note_dict["title"],
-                username=note_dict["username"]
-            )
-            return note
-        except(ValueError, KeyError, TypeError) as e:
-            raise DataIntegrityError(strings.data_fmt_err_str + str(note_dict) + ": " + str(e))
+        return schema_for(note_class).decode(note_dict)
 
     @staticmethod
     def sort_notes(notes, by_created=True, descending=True):
@@ -57,20 +157,314 @@ class NoteManager:
         return sorted(notes, key=lambda x: x.created_date, reverse=descending) if by_created else \
             sorted(notes, key=lambda x: (x.issue_date == datetime.min, x.issue_date), reverse=True)
 
+    def sorted_notes(self, by_created=True, descending=True):
+        """The function return a list of stored notes ordered by the created_date or, if by_created is False,
+        by the issue_date with the notes without a deadline date treated as the latest ones.
+        The lists come from the incrementally maintained sorted views and are memoized until
+        the next change of the notes.
+        """
+        cache_key = ("sorted", by_created, descending)
+        found, cached = self._cache.get(cache_key, self._version)
+        if not found:
+            self._sync_indexes()
+            view = self._created_view if by_created else self._issue_view
+            cached = [self._notes[id_] for id_ in view.ids(descending)]
+            self._cache.put(cache_key, self._version, cached)
+        return list(cached)
+
+    def query(self, order_by="created_date", descending=True, offset=0, limit=None):
+        """The function return a page of notes ordered by a given field name.
+
+        The argument 'order_by' takes one of the 'created_date', 'issue_date', 'title' or 'username' values.
+
+        The arguments 'offset' and 'limit' take the number of notes to skip and the page size,
+        a limit None means all notes after the offset.
+
+        The created_date and issue_date pages are sliced from the sorted views, the other orders
+        use a partial heap selection when the limit is given.
+        Raises a ValueError exception if the order or the page bounds are wrong.
+        """
+        if order_by not in _ORDER_KEYS:
+            raise ValueError(strings.unknown_order_str + str(order_by))
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError(strings.wrong_page_str + str((offset, limit)))
+        stop = None if limit is None else offset + limit
+        self._sync_indexes()
+        view = self._views.get(order_by)
+        if view is not None:
+            return [self._notes[id_] for id_ in view.ids(descending, offset, stop)]
+        key = _ORDER_KEYS[order_by]
+        if stop is None:
+            return sorted(self._notes.values(), key=key, reverse=descending)[offset:]
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return select(stop, self._notes.values(), key=key)[offset:]
+
+    def iter_notes(self):
+        """The function yields the stored notes lazily in the insertion order without copying the collection.
+        The notes must not be added or deleted until the iteration is over.
+        """
+        yield from self._notes.values()
+
     @property
     def notes(self):
-        """The attribute gives access to the private list of Note objects stored in class."""
-        return self._notes
+        """The attribute gives a list of Note objects stored in class in the insertion order."""
+        return list(self._notes.values())
+
+    def _add_to_index(self, note):
+        """The function puts a note to the id_ index and gives it the next position
+        in the insertion order. A note with already known id_ replaces the old one.
+        """
+        self._remember(note.id_)
+        if note.id_ in self._notes:
+            self._unindex_note(self._notes[note.id_])
+        else:
+            self._positions[note.id_] = self._next_position
+            self._next_position += 1
+        self._notes[note.id_] = note
+        self._index_note(note)
+        self._dirty_ids.add(note.id_)
+        self._version += 1
+
+    def _remove_from_index(self, id_):
+        """The function removes a note from the id_ index and returns it
+        or raises a ValueError exception if id_ match not found.
+        """
+        if id_ not in self._notes:
+            raise ValueError(strings.note_with_id_str + str(id_) + strings.not_found_str)
+        self._remember(id_)
+        note = self._notes.pop(id_)
+        del self._positions[id_]
+        self._unindex_note(note)
+        self._dirty_ids.add(id_)
+        self._version += 1
+        return note
+
+    @property
+    def dirty(self):
+        """The attribute tells if there are changes not saved to the file storage yet."""
+        return bool(self._dirty_ids)
+
+    def is_dirty(self, id_):
+        """The function checks if a note with a given ID was added, changed or deleted
+        after the last save to the file storage.
+        """
+        return id_ in self._dirty_ids or None in self._dirty_ids
+
+    def _index_note(self, note, indexes=None):
+        """The function adds a note to the given secondary indexes or to all of them.
+        Inside a batch or while the lazy notes are loaded the note is only marked to be reindexed
+        before the next query.
+        """
+        if self._batch_depth or self._deferred_indexing:
+            self._mark_pending(note.id_)
+            return
+        for index in self._indexes if indexes is None else indexes:
+            index.add(note)
+
+    def _unindex_note(self, note, indexes=None):
+        """The function removes a note from the given secondary indexes or from all of them.
+        Inside a batch the note is only marked to be reindexed when the batch ends.
+        """
+        if self._batch_depth:
+            self._mark_pending(note.id_)
+            return
+        for index in self._indexes if indexes is None else indexes:
+            index.remove(note.id_)
+
+    def _reindex_note(self, note, indexes, changed):
+        """The function reindexes a note changed in place in the given secondary indexes,
+        which look only at the fields with the given names. Inside a batch or while the lazy notes
+        are loaded the changed fields are only marked to be reindexed before the next query.
+        """
+        if self._batch_depth or self._deferred_indexing:
+            self._mark_pending(note.id_, changed)
+            return
+        for index in indexes:
+            index.update(note, changed)
+
+    def _mark_pending(self, id_, changed=None):
+        """The function marks the fields with the given names of a note with a given ID
+        or the whole note if 'changed' is None to be reindexed before the next query.
+        """
+        if changed is None or self._pending.get(id_, ()) is None:
+            self._pending[id_] = None
+        else:
+            self._pending.setdefault(id_, set()).update(changed)
+
+    def _sync_indexes(self):
+        """The function reindexes the notes changed inside a batch or loaded lazily, every note only once.
+        A note changed in place is reindexed only by the indexes of its changed fields.
+        A lazy note with a broken field is dropped with a warning, like a broken record is skipped
+        when the notes are loaded eagerly.
+        """
+        broken = []
+        for id_, changed in self._pending.items():
+            note = self._notes.get(id_)
+            try:
+                for index in self._indexes:
+                    if note is None or changed is None:
+                        index.remove(id_)
+                        if note is not None:
+                            index.add(note)
+                    elif not changed.isdisjoint(index.fields):
+                        index.update(note, changed)
+            except DataIntegrityError as e:
+                warnings.warn(str(e))
+                broken.append(id_)
+        self._pending.clear()
+        for id_ in broken:
+            for index in self._indexes:
+                index.remove(id_)
+            del self._notes[id_]
+            del self._positions[id_]
+        if broken:
+            self._version += 1
+
+    def _remember(self, id_, changed=()):
+        """The function saves the note with a given ID and its position before its first change inside a batch
+        and the values of the fields with the given names before they are changed, so the batch can be rolled back
+        to the same note objects.
+        """
+        if not self._batch_depth:
+            return
+        if id_ not in self._undo:
+            self._undo[id_] = (self._notes.get(id_), self._positions.get(id_), {})
+        note, _, saved = self._undo[id_]
+        if note is None or note is not self._notes.get(id_):
+            return
+        for name in changed:
+            if name not in saved:
+                try:
+                    saved[name] = getattr(note, name)
+                except DataIntegrityError:
+                    # A broken lazy field keeps its raw value in the private attribute
+                    saved[name] = getattr(note, "_" + name)
+
+    def _rollback(self):
+        """The function restores the notes changed inside a batch to their state before the batch."""
+        for id_, (note, position, saved) in self._undo.items():
+            if note is None:
+                if id_ in self._notes:
+                    del self._notes[id_]
+                    del self._positions[id_]
+            else:
+                if saved:
+                    self._preserve(note)
+                for name, value in saved.items():
+                    setattr(note, name, value)
+                self._notes[id_] = note
+                self._positions[id_] = position
+            self._mark_pending(id_)
+        self._notes = dict(sorted(self._notes.items(), key=lambda x: self._positions[x[0]]))
+        self._undo.clear()
+        self._version += 1
+
+    @contextmanager
+    def batch(self):
+        """The function return a context manager which applies all mutations made inside it in memory,
+        reindexes every changed note once and saves the notes to the file storage once on exit.
+        If the block raises an exception or the saving fails, all changes are rolled back and
+        the exception is raised again. In the write-behind mode the batch waits for the background save,
+        so a failed save is rolled back too and the whole storage is marked dirty.
+        Nested batches are the part of the outer one.
+        """
+        if self._batch_depth:
+            yield self
+            return
+        self._batch_depth = 1
+        try:
+            yield self
+            self._batch_depth = 0
+            self._sync_indexes()
+            self._write_storage()
+            if self._persister is not None:
+                try:
+                    self._persister.flush()
+                except BaseException:
+                    self._dirty_ids.add(None)
+                    raise
+        except BaseException:
+            self._batch_depth = 0
+            self._rollback()
+            self._sync_indexes()
+            raise
+        finally:
+            self._batch_depth = 0
+            self._undo.clear()
+
+    def add_many(self, notes):
+        """The function appends the given notes in a batch with a single save to the file storage."""
+        with self.batch():
+            for note in notes:
+                self.append_note(note)
+
+    def update_many(self, changes):
+        """The function updates the notes in a batch with a single save to the file storage.
+        It takes a dict mapping the note IDs to the dicts of the changed fields.
+        """
+        with self.batch():
+            return [self.update_note(id_, **note_changes) for id_, note_changes in changes.items()]
+
+    def delete_many(self, ids):
+        """The function deletes the notes by the given IDs in a batch with a single save
+        to the file storage and returns a list of the deleted notes.
+        """
+        with self.batch():
+            return [self.delete_note_by_id(id_) for id_ in ids]
+
+    def _sorted_by_position(self, ids):
+        """The function return a given collection of IDs sorted in the insertion order."""
+        return sorted(ids, key=self._positions.__getitem__)
 
     def _get_note_index_by_id(self, id_):
-        """The function return an index of the note list element if note.id_ and the given id_ are equal.
-        If no match found the function return -1.
+        """The function return a position of the note in the insertion order if note.id_ and the given id_
+        are equal. If no match found the function return -1.
+        """
+        return self._positions.get(id_, -1)
+
+    def _plan(self, predicate):
+        """The function return an execution Plan of a given query predicate, which falls back
+        to a full scan when the indexes don't narrow the search enough.
         """
-        idx = -1
-        for i, note in enumerate(self._notes):
-            if note.id_ == id_:
-                idx = i
-        return idx
+        self._sync_indexes()
+        return plan_query(predicate, self._query_indexes, len(self._notes))
+
+    def _iter_found(self, predicate):
+        """The function yields the notes matching a given query predicate in the insertion order.
+        The candidates given by the plan are verified by the predicate one by one.
+        """
+        plan = self._plan(predicate)
+        if plan.uses_index:
+            notes = (self._notes[id_] for id_ in self._sorted_by_position(plan.fetch()))
+        else:
+            notes = self._notes.values()
+        for note in notes:
+            if predicate.matches(note):
+                yield note
+
+    def _find_ids(self, predicate):
+        """The function return a list of IDs of the notes matching a given query predicate
+        in the insertion order.
+        """
+        return [note.id_ for note in self._iter_found(predicate)]
+
+    @staticmethod
+    def _filter_predicate(keys=None, status=None):
+        """The function return a query predicate matching any of the given keywords and/or the status."""
+        predicates = []
+        if keys:
+            predicates.append(Or(*(Keyword(key) for key in keys)))
+        if status is not None:
+            predicates.append(StatusIs(status))
+        return And(*predicates)
+
+    def _filter_ids(self, keys=None, status=None):
+        """The function return a list of IDs of the notes filtered by keywords and/or status
+        in the insertion order.
+        """
+        if not self._notes:
+            return []
+        return self._find_ids(self._filter_predicate(keys, status))
 
     def _get_notes_indexes_by_filter(self, keys=None, status=None):
         """The function return a set of unique indexes filtered by keywords and/or status.
@@ -79,103 +473,369 @@ class NoteManager:
 
         The argument 'status' takes a NoteStatus(Enum) value.
         """
-        if not self._notes:
-            return []
-        filtered_indexes = set()
-        for i, note in enumerate(self._notes):
-            status_match = (status is None or note.status == status)
-            keyword_match = False
-            if keys:
-                for key in keys:
-                    key = key.strip().lower()
-                    if (key in note.username.lower()) or \
-                            (key in note.title.lower()) or \
-                            (key in note.content.lower()):
-                        keyword_match = True
-                        break
-            else:
-                keyword_match = True
-            if status_match and keyword_match:
-                filtered_indexes.add(i)
-        return filtered_indexes
+        return {self._positions[id_] for id_ in self._filter_ids(keys, status)}
 
     def import_notes_from_dicts(self, note_dicts):
-        """The function takes a list of dictionaries,
-        loaded from JSON or YAML file and appends it to the _notes list as notes.
+        """The function takes a list (or any iterable, like the import_from_jsonl() generator) of dictionaries,
+        loaded from JSON or YAML file, appends it to the _notes list as notes and returns the list of them.
         Raises an exceptions if list is empty or if the dictionaries contain wrong model.
         """
         if not note_dicts:
             raise ValueError(strings.empty_list_io_str)
+        imported = []
+        decode = self._schema.decode
         for d in note_dicts:
             try:
-                self._notes.append(self._from_dict(d))
+                note = decode(d)
             except DataIntegrityError as e:
                 raise DataIntegrityError(strings.import_failed_str + str(e))
+            self._add_to_index(note)
+            imported.append(note)
+        if not imported:
+            raise ValueError(strings.empty_list_io_str)
+        return imported
 
     def export_notes_as_dicts(self):
         """The function return a list of dictionaries converted from _notes for serialization purposes
         if the _notes list is not empty.
         """
         if self._notes:
-            return [asdict(note) for note in self._notes] if self._notes else []
+            encode = self._schema.encode
+            return [encode(note) for note in self._notes.values()]
+
+    def iter_serialized_notes(self):
+        """The function yields the dicts of the primitive values (the ISO date strings, the status names
+        and the UUID strings) of the stored notes in the insertion order one by one for the streaming export.
+        The notes must not be added or deleted until the iteration is over.
+        """
+        return self._schema.serialize_all(self._notes.values())
+
+    def export_notes_to_file(self, path, notes=None, file_format="yaml"):
+        """The function dumps given notes or all stored ones to a given file in the YAML, JSON
+        or JSON Lines format. The notes are serialized and written one by one in buffered chunks,
+        so a filtered subset like the iter_filter() one is exported without a copy.
+        Raises a FileIOError exception if export to the file failed
+        and a ValueError exception if there is no note to export or the format is unknown.
+        """
+        exporters = {"yaml": export_to_yaml, "json": export_to_json, "jsonl": export_to_jsonl}
+        if file_format not in exporters:
+            raise ValueError(strings.unknown_codec_str + str(file_format))
+        exporters[file_format](self._schema.serialize_all(self._notes.values() if notes is None else notes), path)
 
     def append_note(self, note):
         """The function takes a created note as an argument and appends it to the _notes list.
+        A note of the other class than note_class is converted before.
         Also, it appends a note to the file storage and raises a FileIOError exception if
         export to the file fails.
         """
-        self._notes.append(note)
+        if not isinstance(note, self.note_class):
+            note = self.note_class(**self._schema.encode(note))
+        self._add_to_index(note)
+        if self._batch_depth:
+            return
+        if self._journal is not None:
+            self._journal_record({"op": "add", "note": self._schema.serialize(note)}, ids=(note.id_,))
+            return
+        if self._persister is not None:
+            self._schedule_save(self._export)
+            return
         try:
-            export_to_yaml([asdict(note)], self.storage_path, False)
+            self._export([self._schema.serialize(note)], self.storage_path, False)
+            self._dirty_ids.discard(note.id_)
+            self._cache_stale = self.snapshot_cache
         except FileIOError as e:
-            warnings.warn(e) # noqa
+            warnings.warn(str(e)) # noqa
 
     def get_note_by_id(self, id_):
         """The function return a note by a given ID or
         raises a ValueError exception if id_ match not found.
         """
-        for note in self._notes:
-            if id_ == note.id_:
-                return note
-        raise ValueError(strings.note_with_id_str + str(id_) + strings.not_found_str)
+        try:
+            return self._notes[id_]
+        except KeyError:
+            raise ValueError(strings.note_with_id_str + str(id_) + strings.not_found_str)
+
+    def _import(self, path):
+        """The function return the dicts read from a given file in the storage format.
+        Raises a FileIOError exception if import from the file failed.
+        """
+        if self.storage_format == "jsonl":
+            return import_from_jsonl(path)
+        return import_from_yaml(path)
+
+    def _export(self, dicts, path, rewrite=True):
+        """The function dumps given dicts (a list or an iterator) to a given file in the storage format
+        as the dicts come, so the whole document is never built in the memory.
+        If rewrite=False the dicts are appended to the file.
+        Raises a FileIOError exception if export to the file failed.
+        """
+        if self.storage_format == "jsonl":
+            export_to_jsonl(dicts, path, rewrite)
+        else:
+            export_to_yaml(dicts, path, rewrite)
+
+    def _write_storage(self):
+        """The function dumps _notes list to the file storage or empties the file if no notes left.
+        The notes are written to a temporary file which replaces the file storage only when complete.
+        Nothing is written if no note changed after the last save. In the journal mode only the changed
+        notes are appended to the journal and in the write-behind mode the saving is only scheduled.
+        Raises a FileIOError exception if export to the file failed.
+        """
+        if not self._dirty_ids:
+            return
+        self._sync_indexes()
+        if self._journal is not None:
+            self._write_dirty_to_journal()
+        elif self._persister is not None:
+            self._schedule_save(self._export)
+        else:
+            note_dicts = self._serialized_for_cache()
+            export_atomically(self._export, note_dicts, self.storage_path)
+            self._dirty_ids.clear()
+            self._store_cache(note_dicts)
+
+    def _schedule_save(self, export):
+        """The function schedules the background saving of all notes with a given export function.
+        The changes are treated as saved, a failed save marks the whole storage dirty again on flush().
+        """
+        self._persister.schedule(self._persist, export, self._snapshot())
+        self._dirty_ids.clear()
+
+    def _write_dirty_to_journal(self):
+        """The function appends the changed notes to the journal in the insertion order and the deletions
+        of the removed ones. Raises a FileIOError exception if writing to the journal failed.
+        """
+        records = [{"op": "delete", "id_": str(id_)} for id_ in self._dirty_ids if id_ not in self._notes]
+        changed = self._sorted_by_position(id_ for id_ in self._dirty_ids if id_ in self._notes)
+        records += [{"op": "add", "note": self._schema.serialize(self._notes[id_])} for id_ in changed]
+        self._journal.append(*records)
+        self._dirty_ids.clear()
+        if self._journal.size > JOURNAL_COMPACT_SIZE:
+            self._compact_journal()
 
     def save_notes_to_file(self):
         """The function dumps _notes list to the file storage or raises an exception
-        if export to the file failed.
+        if export to the file failed. Inside a batch the saving is postponed to the batch end.
+        Nothing is written if no note changed after the last save.
         """
+        if self._batch_depth:
+            return
         try:
-            export_to_yaml(self.export_notes_as_dicts(), self.storage_path)
-        except (ValueError, FileIOError) as e:
-            warnings.warn(e)
+            self._write_storage()
+        except FileIOError as e:
+            warnings.warn(str(e))
 
     def save_notes_json(self):
-        """The function dumps _notes list to the file storage in JSON format or raises an exception
-        if export to the file failed.
+        """The function dumps _notes list to the file storage in JSON format through a temporary file
+        or warns if there are no notes or export to the file failed.
+        In the write-behind mode the saving is only scheduled.
         """
+        self._sync_indexes()
+        if self._persister is not None:
+            self._schedule_save(export_to_json)
+            return
+        if not self._notes:
+            warnings.warn(strings.empty_list_export_str)
+            return
         try:
-            export_to_json(self.export_notes_as_dicts(), self.storage_path)
+            note_dicts = self._serialized_for_cache()
+            export_atomically(export_to_json, note_dicts, self.storage_path)
+            self._store_cache(note_dicts)
         except (ValueError, FileIOError) as e:
-            warnings.warn(e)
+            warnings.warn(str(e))
 
     def load_notes_from_file(self):
         """The function load notes from the file storage or raises an exception when
         file IO or converting model to Note dataclass object fails.
+        After loading no note is treated as changed, as the notes match the file storage.
+        The lazy notes are indexed on the first query.
         """
-        if not self.storage_path.is_file():
-            warnings.warn(strings.file_str + str(self.storage_path) + strings.not_found_str)
+        self._deferred_indexing = self.lazy_notes
+        try:
+            if not self.storage_path.is_file():
+                warnings.warn(strings.file_str + str(self.storage_path) + strings.not_found_str)
+                try:
+                    with open(self.storage_path, 'w'):
+                        pass
+                    warnings.warn(strings.new_file_str)
+                except OSError as e:
+                    warnings.warn(strings.new_file_failed_str + str(e))
+                finally:
+                    warnings.warn(strings.note_list_empty_str)
+            else:
+                notes = self._load_cache()
+                if notes:
+                    for note in notes:
+                        self._add_to_index(note)
+                else:
+                    try:
+                        imported = self.import_notes_from_dicts(self._import(self.storage_path))
+                        self._store_cache(self._schema.serialize_all(imported))
+                    except (FileIOError, DataIntegrityError) as e:
+                        warnings.warn(str(e))
+            if self.journaled:
+                self._journal = None
+                journal = NoteJournal(self.storage_path)
+                try:
+                    self._replay_journal(journal)
+                except (FileIOError, DataIntegrityError) as e:
+                    warnings.warn(str(e))
+                self._journal = journal
+            self._dirty_ids.clear()
+        finally:
+            self._deferred_indexing = False
+
+    def _replay_journal(self, journal):
+        """The function applies the records of a given journal to the notes loaded from the file storage.
+        The records are idempotent, so the ones already folded into the file storage change nothing.
+        Raises DataIntegrityError if a record is wrong.
+        """
+        for record in journal.replay():
             try:
-                with open(self.storage_path, 'w'):
-                    pass
-                warnings.warn(strings.new_file_str)
-            except OSError as e:
-                warnings.warn(strings.new_file_failed_str + str(e))
-            finally:
-                warnings.warn(strings.note_list_empty_str)
-        else:
+                operation = record["op"]
+                if operation == "add":
+                    self._add_to_index(self._schema.decode(record["note"]))
+                    continue
+                id_ = UUID(record["id_"])
+            except (KeyError, ValueError, TypeError) as e:
+                raise DataIntegrityError(strings.data_fmt_err_str + str(record) + ": " + str(e))
+            if id_ not in self._notes:
+                continue
+            if operation == "update":
+                self.update_note(id_, **decode_fields(record.get("fields", {})))
+            elif operation == "delete":
+                self._remove_from_index(id_)
+
+    def _journal_record(self, *records, ids=()):
+        """The function appends the given records about the notes with the given IDs to the journal
+        and starts the compaction if the journal grows too large. Inside a batch nothing is written
+        as the batch end writes all changed notes anyway.
+        """
+        if self._journal is None or self._batch_depth:
+            return
+        try:
+            self._journal.append(*records)
+        except FileIOError as e:
+            warnings.warn(str(e))
+            return
+        self._dirty_ids.difference_update(ids)
+        if self._journal.size > JOURNAL_COMPACT_SIZE:
+            self._compact_journal()
+
+    def _compact_journal(self, background=True):
+        """The function folds the journal into the file storage. The journal is rotated and the snapshot
+        of the notes is taken right away, then the snapshot is written in a background thread,
+        so the next changes go to the fresh journal. Raises a FileIOError exception if the journal
+        can't be rotated or, if background is False, the snapshot can't be written.
+        """
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._sync_indexes()
+        snapshot = self._snapshot()
+        self._journal.rotate()
+        self._dirty_ids.clear()
+        if not background:
+            self._write_snapshot(snapshot)
+            return
+        self._compaction = threading.Thread(target=self._write_snapshot, args=(snapshot, True), daemon=True)
+        self._compaction.start()
+
+    def _write_snapshot(self, snapshot, background=False):
+        """The function atomically writes a given snapshot of the notes to the file storage, saves
+        the cache of it and removes the rotated journal. A background run warns about the errors
+        instead of raising a FileIOError exception.
+        """
+        try:
+            self._persist(self._export, snapshot)
+            self._journal.drop_rotated()
+        except FileIOError as e:
+            if not background:
+                raise
+            warnings.warn(str(e))
+
+    def _snapshot(self):
+        """The function return a copy-on-write snapshot of the notes for the background saving,
+        so the notes changed after scheduling don't get to the file half-updated
+        and no note is copied when the saving is scheduled.
+        """
+        snapshot = NoteSnapshot(self._notes.values())
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def _preserve(self, note):
+        """The function lets the snapshots in use keep a given note as it is before it's changed in place."""
+        for snapshot in self._snapshots:
+            snapshot.preserve(note)
+
+    def _persist(self, export, snapshot):
+        """The function serializes the notes of a given snapshot and atomically dumps them to the file storage
+        with a given export function, it's run by the background thread. Raises a FileIOError exception
+        if export to the file failed.
+        """
+        try:
+            note_dicts = snapshot.map(self._schema.serialize)
+            export_atomically(export, note_dicts, self.storage_path)
+            self._store_cache(note_dicts)
+        finally:
+            snapshot.close()
+
+    def _serialized_for_cache(self):
+        """The function return the serialized notes for saving to the file storage: a list of them
+        if the snapshot cache is on, so the cache is stored from the same dicts, or a generator otherwise.
+        """
+        return list(self.iter_serialized_notes()) if self.snapshot_cache else self.iter_serialized_notes()
+
+    def _load_cache(self):
+        """The function return a list of the notes from the snapshot cache or None if the snapshot cache
+        is off, stale or can't be decoded. The cached dicts are decoded like the parsed ones.
+        """
+        note_dicts = SnapshotCache(self.storage_path).load() if self.snapshot_cache else None
+        if not note_dicts:
+            return None
+        decode = self._schema.decode
+        try:
+            return [decode(d) for d in note_dicts]
+        except DataIntegrityError:
+            return None
+
+    def _store_cache(self, note_dicts):
+        """The function rebuilds the snapshot cache of the just saved file storage from given note dicts
+        and warns if it fails. Nothing is done if the snapshot cache is off.
+        """
+        if not self.snapshot_cache:
+            return
+        try:
+            SnapshotCache(self.storage_path).store(note_dicts)
+            self._cache_stale = False
+        except FileIOError as e:
+            warnings.warn(str(e))
+
+    def flush(self):
+        """The function waits until the scheduled background save and the journal compaction are done
+        and warns if the save failed. The failed save marks the whole storage dirty again.
+        """
+        if self._persister is not None:
             try:
-                self.import_notes_from_dicts(import_from_yaml(self.storage_path))
-            except (FileIOError, DataIntegrityError) as e:
-                warnings.warn(e)
+                self._persister.flush()
+            except (FileIOError, DataIntegrityError, ValueError, TypeError) as e:
+                self._dirty_ids.add(None)
+                warnings.warn(str(e))
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        """The function flushes the pending saves, refreshes the snapshot cache left stale by the appended notes
+        and stops the background saving thread.
+        """
+        try:
+            self.flush()
+            if self._cache_stale and not self._dirty_ids:
+                self._store_cache(self.iter_serialized_notes())
+        finally:
+            if self._persister is not None:
+                self._persister.close()
+                self._persister = None
 
     def filter_notes(self, keys=None, state=None):
         """The function return a list of notes filtered by keywords and/or status.
@@ -184,35 +844,119 @@ class NoteManager:
 
         The argument 'state' takes a NoteStatus(Enum) value.
         """
-        found_indexes = self._get_notes_indexes_by_filter(keys, state)
-        return [self._notes[i] for i in found_indexes] if found_indexes else []
+        cache_key = ("filter", tuple(sorted({key.strip().lower() for key in keys})) if keys else (), state)
+        found, cached = self._cache.get(cache_key, self._version)
+        if not found:
+            cached = [self._notes[id_] for id_ in self._filter_ids(keys, state)]
+            self._cache.put(cache_key, self._version, cached)
+        return list(cached)
+
+    def iter_filter(self, keys=None, state=None):
+        """The function yields the notes filtered by keywords and/or status lazily in the insertion order,
+        so the caller can stop after the first matches without filtering the whole collection.
+        The arguments are the same as the filter_notes() ones. The notes must not be added or deleted
+        until the iteration is over.
+        """
+        cache_key = ("filter", tuple(sorted({key.strip().lower() for key in keys})) if keys else (), state)
+        found, cached = self._cache.get(cache_key, self._version)
+        if found:
+            yield from list(cached)
+        elif self._notes:
+            yield from self._iter_found(self._filter_predicate(keys, state))
+
+    def cache_info(self):
+        """The function return the hits, misses, maxsize and currsize statistics of the result cache."""
+        return self._cache.info()
+
+    def find(self, predicate):
+        """The function return a list of notes matching a given query predicate built from
+        the And, Or, Not, StatusIs, UsernameIs, Keyword, CreatedBetween and IssueBetween nodes.
+        """
+        return [self._notes[id_] for id_ in self._find_ids(predicate)]
+
+    def explain(self, predicate):
+        """The function return a text description of the plan chosen for a given query predicate."""
+        return self._plan(predicate).explain()
 
     def delete_note_by_id(self, id_):
         """The function return a note popped from the _notes list by a given ID
         or raises a ValueError exception if no id_ match is found.
         """
-        i = self._get_note_index_by_id(id_)
-        if i == -1:
-            raise ValueError(strings.note_with_id_str + str(id_) + strings.not_found_str)
-        return self._notes.pop(i)
+        note = self._remove_from_index(id_)
+        self._journal_record({"op": "delete", "id_": str(id_)}, ids=(id_,))
+        return note
 
     def delete_by_state(self, state):
         """The function delete _notes filtered by state.
         It takes a NoteStatus(Enum) value as an argument.
+        The notes storage is rebuilt in a single pass instead of deleting the notes one by one.
         """
-        found_indexes = self._get_notes_indexes_by_filter(status=state)
-        if not found_indexes:
+        self._sync_indexes()
+        found_ids = self._status_index.pop(state)
+        if not found_ids:
             return False
-        for i in sorted(found_indexes, reverse=True):
-            del self._notes[i]
+        for id_ in found_ids:
+            self._remember(id_)
+        other_indexes = [index for index in self._indexes if index is not self._status_index]
+        for id_ in found_ids:
+            self._unindex_note(self._notes[id_], other_indexes)
+        self._notes = {id_: note for id_, note in self._notes.items() if id_ not in found_ids}
+        self._positions = {id_: self._positions[id_] for id_ in self._notes}
+        self._dirty_ids |= found_ids
+        self._version += 1
+        self._journal_record(*({"op": "delete", "id_": str(id_)} for id_ in found_ids), ids=found_ids)
         return True
 
+    def update_note(self, id_, /, **changes):
+        """The function sets the given fields of a note found by a given ID, keeps the indexes
+        consistent and returns the updated note. The fields set to their current values are skipped,
+        so the note isn't marked as changed if nothing differs. A broken lazy field can be set to a new value
+        before the first query. Raises a ValueError exception if no id_ match is found or if a field can't be changed.
+        """
+        note = self.get_note_by_id(id_)
+        editable = {field.name for field in fields(note)} - {"id_"}
+        for name in changes:
+            if name not in editable:
+                raise ValueError(strings.unknown_field_str + name)
+        for name, value in list(changes.items()):
+            try:
+                if getattr(note, name) == value:
+                    del changes[name]
+            except DataIntegrityError:
+                pass
+        if not changes:
+            return note
+        self._remember(id_, changes)
+        self._preserve(note)
+        for name, value in changes.items():
+            setattr(note, name, value)
+        self._reindex_note(note, [index for index in self._indexes if not changes.keys().isdisjoint(index.fields)],
+                           changes.keys())
+        self._dirty_ids.add(id_)
+        self._version += 1
+        self._journal_record({"op": "update", "id_": str(id_), "fields": encode_fields(changes)}, ids=(id_,))
+        return note
+
+    def clear_notes(self):
+        """The function removes all notes from the memory and the indexes.
+        The file storage stays untouched.
+        """
+        for id_ in self._notes:
+            self._remember(id_)
+        self._dirty_ids.update(self._notes)
+        self._notes.clear()
+        self._positions.clear()
+        for index in self._indexes:
+            index.clear()
+        self._version += 1
+
     def get_urgent_notes_sorted(self):
         """The function return a list of 3 lists of notes filtered by the deadline.
         Each note list in the list represents three levels of urgency:
 
-        1. The list with the index 0 represents the notes with the missed deadline sorted by date ascending:
-        the older - the closer to the beginning of the list.
+        1. The list with the index 0 represents the notes with the missed deadline sorted the same way as
+        sort_notes() does by the issue_date: the notes with the empty deadline date go first,
+        then the newer missed deadline - the closer to the beginning of the list.
 
         2. The list with the index 1 represents the notes with the deadline date which match the date
         the function is called.
@@ -220,21 +964,65 @@ class NoteManager:
         3. The list with the index 3 represents the notes with the deadline date which match the date
         the function is called + 1 day.
 
+        The lists with the index 1 and 2 are sorted by the deadline ascending.
         If no notes match the filter condition of the corresponding urgency level the list will be empty (falsy).
         So, if no urgent notes at all – the function will return a list of 3 empty (falsy) lists.
+        All three lists are sliced from the deadline index using a single reference time.
+        The result is cached until the notes change or until any note moves to the other urgency level.
         """
+        now = datetime.now()
+        found, cached = self._cache.get(("urgent",), self._version, now)
+        if found:
+            return [list(notes) for notes in cached] if cached is not None else None
         if not self._notes:
+            self._cache.put(("urgent",), self._version, None)
             return None
-        missed_dl = []
-        today_dl = []
-        oneday_dl = []
-        for note in self._notes:
-            if note.status not in (NoteStatus.TERMLESS, NoteStatus.COMPLETED):
-                days = (note.issue_date - datetime.now()).days
-                if days < 0:
-                    missed_dl.append(note)
-                elif days == 0:
-                    today_dl.append(note)
-                elif days == 1:
-                    oneday_dl.append(note)
-        return [self.sort_notes(missed_dl, False, False), today_dl, oneday_dl]
+        self._sync_indexes()
+        if self.columnar:
+            urgent = self._columnar().urgent(now)
+        else:
+            day = timedelta(days=1)
+            missed_dl = self._deadline_index.between(datetime.min, now)
+            undated = len(self._deadline_index.between(datetime.min, datetime.min + timedelta.resolution))
+            dated = [list(group) for _, group in groupby(missed_dl[undated:], lambda id_: self._notes[id_].issue_date)]
+            missed_dl = missed_dl[:undated] + [id_ for group in reversed(dated) for id_ in group]
+            today_dl = self._deadline_index.between(now, now + day)
+            oneday_dl = self._deadline_index.between(now + day, now + 2 * day)
+            urgent = [[self._notes[id_] for id_ in ids] for ids in (missed_dl, today_dl, oneday_dl)]
+        self._cache.put(("urgent",), self._version, urgent, self._urgency_expires(now))
+        return [list(notes) for notes in urgent]
+
+    def _columnar(self):
+        """The function return the columnar copy of the notes, which is maintained like the indexes."""
+        self._sync_indexes()
+        return self._columnar_store
+
+    def status_counts(self):
+        """The function return a dict with the number of notes for every NoteStatus value."""
+        if self.columnar:
+            return self._columnar().status_counts()
+        self._sync_indexes()
+        return {status: len(self._status_index.candidates(status)) for status in NoteStatus}
+
+    def notes_between(self, field, start=None, end=None):
+        """The function return a list of notes with the 'created_date' or 'issue_date' field value
+        in the range from start (inclusive) to end (exclusive) in the insertion order.
+        None means an open bound. Raises a ValueError exception if the field is wrong.
+        """
+        predicates = {"created_date": CreatedBetween, "issue_date": IssueBetween}
+        if field not in predicates:
+            raise ValueError(strings.unknown_order_str + str(field))
+        if self.columnar:
+            return self._columnar().between(field, start, end)
+        return self.find(predicates[field](start, end))
+
+    def _urgency_expires(self, now):
+        """The function return the earliest moment after a given one when any note moves
+        to the other urgency level or None if no note will move.
+        """
+        moments = []
+        for shift in (timedelta(0), timedelta(days=1), timedelta(days=2)):
+            deadline = self._deadline_index.first_after(now + shift)
+            if deadline is not None:
+                moments.append(deadline - shift)
+        return min(moments) if moments else None
@@ -0,0 +1,127 @@
+from copy import copy
+import threading
+import time
+
+
+class WriteBehindPersister:
+    """The class WriteBehindPersister runs the saves to the file storage on a background thread.
+    A burst of scheduled saves is coalesced into one: the save runs when no new one was scheduled
+    for 'delay' seconds, but no later than 'max_delay' seconds after the first of them,
+    and only the last scheduled save is done.
+    """
+    def __init__(self, delay=0.5, max_delay=5.0):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._pending = None
+        self._first = None
+        self._last = None
+        self._busy = False
+        self._flushing = False
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, write, *args):
+        """The function schedules a call of a given write function with the given arguments
+        replacing the save scheduled before and not done yet.
+        """
+        with self._condition:
+            now = time.monotonic()
+            if self._pending is None:
+                self._first = now
+            self._pending = (write, args)
+            self._last = now
+            self._condition.notify_all()
+
+    def _run(self):
+        """The function is the loop of the background thread waiting for the scheduled saves."""
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                while not (self._flushing or self._closed):
+                    timeout = min(self._last + self.delay, self._first + self.max_delay) - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                write, args = self._pending
+                self._pending = None
+                self._busy = True
+            error = None
+            try:
+                write(*args)
+            except Exception as e:
+                error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    if error is not None:
+                        self._error = error
+                    self._condition.notify_all()
+
+    def flush(self):
+        """The function runs the scheduled save without waiting for the delay and waits until it's done.
+        Raises the exception of the last failed save if any, the failed save doesn't stop the thread.
+        """
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+            self._flushing = False
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """The function flushes the scheduled save and stops the background thread."""
+        try:
+            self.flush()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            self._thread.join()
+
+
+class NoteSnapshot:
+    """The class NoteSnapshot represents the notes as they are when a background save is scheduled
+    without copying them. The snapshot keeps the references to the notes and a note is copied only
+    when it's about to be changed in place while the snapshot is in use. The notes are read under
+    the lock of the snapshot, so the saving thread never sees a note changed half-way.
+    """
+    def __init__(self, notes):
+        self._notes = list(notes)
+        self._saved = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._notes)
+
+    def preserve(self, note):
+        """The function keeps a copy of a given note before it's changed in place if the snapshot is in use."""
+        with self._lock:
+            if not self._closed and id(note) not in self._saved:
+                self._saved[id(note)] = copy(note)
+
+    def map(self, function):
+        """The function return a list of the results of a given function applied to every note
+        as it was when the snapshot was taken.
+        """
+        result = []
+        for note in self._notes:
+            with self._lock:
+                result.append(function(self._saved.get(id(note), note)))
+        return result
+
+    def close(self):
+        """The function releases the notes and their copies, the notes changed afterwards aren't copied."""
+        with self._lock:
+            self._closed = True
+            self._notes = []
+            self._saved.clear()
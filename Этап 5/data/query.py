@@ -0,0 +1,245 @@
+from datetime import datetime
+from .indexes import TEXT_FIELDS
+
+
+SCAN_RATIO = 0.5
+
+
+class Plan:
+    """The class Plan represents a step of the query execution plan.
+
+    The attribute 'estimate' keeps the expected number of candidate notes or None
+    if the step can't use an index and needs a full scan.
+
+    The attribute 'fetch' keeps a function returning the set of candidate IDs.
+
+    The attribute 'check' tells that the step only verifies the candidates found by another step.
+    """
+    def __init__(self, operation, estimate=None, fetch=None, children=(), check=False):
+        self.operation = operation
+        self.estimate = estimate
+        self.fetch = fetch
+        self.children = children
+        self.check = check
+
+    @property
+    def uses_index(self):
+        """The attribute tells if the step is answered by an index."""
+        return self.estimate is not None
+
+    def explain(self, depth=0):
+        """The function return the plan as an indented text tree."""
+        if self.check:
+            cost = "on candidates"
+        else:
+            cost = "full scan" if self.estimate is None else f"~{self.estimate} notes"
+        lines = ["  " * depth + f"{self.operation} ({cost})"]
+        for child in self.children:
+            lines.append(child.explain(depth + 1))
+        return "\n".join(lines)
+
+
+class Predicate:
+    """The class Predicate is a base class of the query AST nodes.
+    The nodes are combined with the &, | and ~ operators.
+    """
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def matches(self, note):
+        """The function checks if a given note satisfies the predicate."""
+        raise NotImplementedError
+
+    def plan(self, indexes):
+        """The function return a Plan of the predicate using a given dict of indexes."""
+        return Plan(f"scan {self}")
+
+
+class And(Predicate):
+    """The class And represents a conjunction of predicates. The planner drives the query
+    by the most selective indexed child and verifies the others on its candidates.
+    """
+    def __init__(self, *children):
+        self.children = children
+
+    def __and__(self, other):
+        return And(*self.children, other)
+
+    def __str__(self):
+        return "(" + " AND ".join(str(child) for child in self.children) + ")"
+
+    def matches(self, note):
+        return all(child.matches(note) for child in self.children)
+
+    def plan(self, indexes):
+        plans = [child.plan(indexes) for child in self.children]
+        indexed = [plan for plan in plans if plan.uses_index]
+        if not indexed:
+            return Plan(f"scan {self}", children=plans)
+        driver = min(indexed, key=lambda x: x.estimate)
+        rest = [Plan(f"verify {child}", check=True) for child, plan in zip(self.children, plans) if plan is not driver]
+        return Plan("AND driven by the most selective index", driver.estimate, driver.fetch, [driver] + rest)
+
+
+class Or(Predicate):
+    """The class Or represents a disjunction of predicates. It's answered by the union
+    of the children candidates if all of them use an index.
+    """
+    def __init__(self, *children):
+        self.children = children
+
+    def __or__(self, other):
+        return Or(*self.children, other)
+
+    def __str__(self):
+        return "(" + " OR ".join(str(child) for child in self.children) + ")"
+
+    def matches(self, note):
+        return any(child.matches(note) for child in self.children)
+
+    def plan(self, indexes):
+        plans = [child.plan(indexes) for child in self.children]
+        if not all(plan.uses_index for plan in plans):
+            return Plan(f"scan {self}", children=plans)
+
+        def fetch():
+            found = set()
+            for plan in plans:
+                found |= plan.fetch()
+            return found
+        return Plan("OR union of indexes", sum(plan.estimate for plan in plans), fetch, plans)
+
+
+class Not(Predicate):
+    """The class Not represents a negation of a predicate. It always needs a full scan."""
+    def __init__(self, child):
+        self.child = child
+
+    def __str__(self):
+        return f"NOT {self.child}"
+
+    def matches(self, note):
+        return not self.child.matches(note)
+
+
+class StatusIs(Predicate):
+    """The class StatusIs represents a match of the note status with a NoteStatus value."""
+    def __init__(self, status):
+        self.status = status
+
+    def __str__(self):
+        return f"status = {self.status.name}"
+
+    def matches(self, note):
+        return note.status == self.status
+
+    def plan(self, indexes):
+        ids = indexes["status"].candidates(self.status)
+        return Plan(f"status index {self}", len(ids), lambda: ids)
+
+
+class UsernameIs(Predicate):
+    """The class UsernameIs represents a case-insensitive match of the note username."""
+    def __init__(self, username):
+        self.username = username.strip().lower()
+
+    def __str__(self):
+        return f"username = '{self.username}'"
+
+    def matches(self, note):
+        return note.username.lower() == self.username
+
+    def plan(self, indexes):
+        ids = indexes["username"].candidates(self.username)
+        return Plan(f"username index {self}", len(ids), lambda: ids)
+
+
+class Keyword(Predicate):
+    """The class Keyword represents a case-insensitive substring search of a keyword
+    in the note username, title or content.
+    """
+    def __init__(self, key):
+        self.key = key.strip().lower()
+
+    def __str__(self):
+        return f"keyword '{self.key}'"
+
+    def matches(self, note):
+        for field in TEXT_FIELDS:
+            if self.key in getattr(note, field).lower():
+                return True
+        return False
+
+    def plan(self, indexes):
+        for name in ("trigram", "keyword"):
+            index = indexes[name]
+            estimate = index.estimate(self.key)
+            if estimate is not None:
+                return Plan(f"{name} index {self}", estimate, lambda: index.candidates(self.key))
+        return Plan(f"scan {self}")
+
+
+class _DateRange(Predicate):
+    """The class _DateRange is a base class of the date range predicates.
+    The range includes the start and excludes the end, None means an open bound.
+    """
+    field = None
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        start = "-inf" if self.start is None else self.start.isoformat()
+        end = "+inf" if self.end is None else self.end.isoformat()
+        return f"{self.field} in [{start}, {end})"
+
+    def matches(self, note):
+        value = getattr(note, self.field)
+        return (self.start is None or self.start <= value) and (self.end is None or value < self.end)
+
+
+class CreatedBetween(_DateRange):
+    """The class CreatedBetween represents a range predicate over the created_date."""
+    field = "created_date"
+
+    def plan(self, indexes):
+        ids = indexes["created_date"].between(self.start, self.end)
+        return Plan(f"created_date view {self}", len(ids), lambda: set(ids))
+
+
+class IssueBetween(_DateRange):
+    """The class IssueBetween represents a range predicate over the issue_date."""
+    field = "issue_date"
+
+    def plan(self, indexes):
+        view = indexes["issue_date"]
+        ids = view.between(
+            None if self.start is None else (False, self.start),
+            (True,) if self.end is None else (False, self.end)
+        )
+        if self.matches_empty_date():
+            ids += view.between((True,), None)
+        return Plan(f"issue_date view {self}", len(ids), lambda: set(ids))
+
+    def matches_empty_date(self):
+        """The function checks if the range contains the empty deadline date (datetime.min)."""
+        return (self.start is None or self.start <= datetime.min) and (self.end is None or datetime.min < self.end)
+
+
+def plan_query(predicate, indexes, total):
+    """The function return the Plan of a given predicate over a given dict of indexes and a given total
+    number of notes. Fetching and verifying a candidate found by an index costs up to twice as much as
+    checking a note by a full scan, so the full scan is chosen when the index is expected to give more than
+    SCAN_RATIO of all notes.
+    """
+    plan = predicate.plan(indexes)
+    if plan.uses_index and plan.estimate > total * SCAN_RATIO:
+        return Plan(f"scan {predicate} instead of the index", children=(plan,))
+    return plan
@@ -0,0 +1,95 @@
+from utils import DataIntegrityError, NoteStatus
+from dataclasses import fields
+from datetime import datetime
+from uuid import UUID
+from resources import strings
+import weakref
+
+
+_CONVERTERS = {
+    datetime: datetime.fromisoformat,
+    UUID: UUID,
+    NoteStatus: NoteStatus.__getitem__,
+}
+_SERIALIZERS = {
+    datetime: "{}.isoformat()",
+    UUID: "str({})",
+    NoteStatus: "{}.name",
+}
+
+
+class NoteSchema:
+    """The class NoteSchema represents the field layout of a note class. It compiles once a decoder
+    which builds a note from a dict by the positional arguments with the cached converters of the field
+    types and an encoder which gives a shallow dict of the fields. The note fields are immutable values,
+    so the encoder gives the same dicts as dataclasses.asdict() does without the deep copying.
+    The serializer gives the dicts of the primitive values ready for the file formats: the ISO date strings,
+    the status names and the UUID strings.
+    The note classes with the lazy fields get the raw values, they are parsed on the first access.
+    The schema refers to the note class weakly, so the cached schemas don't keep alive the note classes
+    made for every NoteManager.
+    """
+    def __init__(self, note_class):
+        self._note_class = weakref.ref(note_class)
+        self.field_names = tuple(field.name for field in fields(note_class))
+        lazy = getattr(note_class, "lazy_fields", False)
+        namespace = {"cls": weakref.proxy(note_class)}
+        arguments = []
+        for field in fields(note_class):
+            converter = None if lazy else _CONVERTERS.get(field.type)
+            if converter is None:
+                arguments.append(f"d[{field.name!r}]")
+            else:
+                namespace["convert_" + field.name] = converter
+                arguments.append(f"convert_{field.name}(d[{field.name!r}])")
+        primitives = [
+            f"{field.name!r}: " + _SERIALIZERS.get(field.type, "{}").format("note." + field.name)
+            for field in fields(note_class)
+        ]
+        source = (
+            "def decode(d):\n"
+            f"    return cls({', '.join(arguments)})\n"
+            "def encode(note):\n"
+            "    return {" + ", ".join(f"{name!r}: note.{name}" for name in self.field_names) + "}\n"
+            "def serialize(note):\n"
+            "    return {" + ", ".join(primitives) + "}\n"
+        )
+        exec(source, namespace)
+        self._decode = namespace["decode"]
+        self.encode = namespace["encode"]
+        self.serialize = namespace["serialize"]
+
+    @property
+    def note_class(self):
+        """The attribute gives the note class of the schema."""
+        return self._note_class()
+
+    def decode(self, note_dict):
+        """The function converts a dict loaded from JSON or YAML file to the note
+        and returns it. Raises DataIntegrityError if conversion fails.
+        """
+        try:
+            return self._decode(note_dict)
+        except (ValueError, KeyError, TypeError) as e:
+            if isinstance(note_dict, dict) and not all(name in note_dict for name in self.field_names):
+                raise DataIntegrityError(strings.missing_fields_str + str(note_dict))
+            raise DataIntegrityError(strings.data_fmt_err_str + str(note_dict) + ": " + str(e))
+
+    def serialize_all(self, notes):
+        """The function yields the dicts of the primitive values of given notes one by one,
+        so an export doesn't need the full list of dicts.
+        """
+        serialize = self.serialize
+        for note in notes:
+            yield serialize(note)
+
+
+_SCHEMAS = weakref.WeakKeyDictionary()
+
+
+def schema_for(note_class):
+    """The function return the NoteSchema of a given note class compiling it on the first call."""
+    schema = _SCHEMAS.get(note_class)
+    if schema is None:
+        schema = _SCHEMAS[note_class] = NoteSchema(note_class)
+    return schema
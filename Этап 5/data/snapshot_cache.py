@@ -0,0 +1,67 @@
+from utils import FileIOError
+from pathlib import Path
+import hashlib
+import json
+import os
+from resources import strings
+
+
+CACHE_FORMAT = 2
+
+
+def file_digest(path):
+    """The function return the BLAKE2 hash of a given file content."""
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+class SnapshotCache:
+    """The class SnapshotCache represents a JSON copy of the parsed notes kept next to the file storage.
+    The notes are stored as the dicts of the primitive values together with the mtime, size and
+    hash of the file storage they were parsed from, so a stale cache is never used.
+    The cache is plain data decoded like the file storage itself, so a tampered cache can't run any code,
+    it can only give the notes a tampered file storage could give.
+    """
+    def __init__(self, source_path):
+        self.source_path = Path(source_path)
+        self.path = Path(str(source_path) + ".cache")
+
+    def load(self):
+        """The function return the list of note dicts if the cache matches the current file storage
+        or None if the cache is missing, stale or broken.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                cached = json.load(file)
+            stat = self.source_path.stat()
+            if (cached["format"], cached["mtime_ns"], cached["size"]) != (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size):
+                return None
+            if cached["hash"] != file_digest(self.source_path) or not isinstance(cached["notes"], list):
+                return None
+            return cached["notes"]
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+
+    def store(self, note_dicts):
+        """The function saves the given note dicts parsed from the current file storage to the cache
+        or removes the cache if there are no notes. Raises FileIOError if writing fails.
+        """
+        temp_path = Path(str(self.path) + ".tmp")
+        try:
+            note_dicts = list(note_dicts)
+            if not note_dicts:
+                self.path.unlink(missing_ok=True)
+                return
+            stat = self.source_path.stat()
+            cached = {
+                "format": CACHE_FORMAT,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": file_digest(self.source_path),
+                "notes": note_dicts,
+            }
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(cached, file, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            raise FileIOError(strings.cache_failed_str + str(e))
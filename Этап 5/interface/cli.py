@@ -2,7 +2,7 @@ from curses import wrapper
 from datetime import datetime
 import colorama
 from colorama import Fore, Style
-from model import NoteManager, Note
+from model import NoteManager
 from .femto import femto
 from resources import strings
 from utils import NoteStatus, InputType, str_to_date, date_to_str, generate_id, input_to_enum_value
@@ -15,7 +15,7 @@ class NoteManagerCLI:
     displaying user-readable model.
     """
     def __init__(self):
-        self._note_manager = NoteManager()
+        self._note_manager = NoteManager(write_behind=True, snapshot_cache=True)
         colorama.init(autoreset=True)
 
     @staticmethod
@@ -78,22 +78,23 @@ class NoteManagerCLI:
 
     def _list_notes(self):
         """The function lists all notes stored by the NoteManager in shortened format."""
-        for i, note in enumerate(self._note_manager.notes):
+        for note in self._note_manager.iter_notes():
             self._print_note_short(note)
 
-    def _display_notes(self, notes_list, display_full=True, per_page=3):
-        """The function displays the given note_list in the user-readable format paged with
+    def _display_notes(self, total_notes, get_page, display_full=True, per_page=3):
+        """The function displays total_notes notes in the user-readable format paged with
         the given parameters: full or shortened and number of notes per page.
+        The argument 'get_page' takes a function which returns a list of notes
+        by the given offset and limit, so only the displayed page is fetched.
         """
-        if not notes_list:
+        if not total_notes:
             print('\n' + strings.no_notes_disp_str, '\n')
             return
-        total_notes = len(notes_list)
         page = 0
         while True:
             start_index = page * per_page
             end_index = start_index + per_page
-            notes_to_display = notes_list[start_index:end_index]
+            notes_to_display = get_page(start_index, per_page)
             for n in notes_to_display:
                 self._print_note_full(n) if display_full else self._print_note_short(n)
             print(strings.page_str, str(page + 1), strings.total_str, str((total_notes + per_page - 1) // per_page))
@@ -119,12 +120,11 @@ class NoteManagerCLI:
         the parameters given by user input.
         """
         params = self._display_submenu()
+        order_by = "created_date" if 'c' in params else "issue_date"
+        descending = True if 'd' in params else False
         self._display_notes(
-            self._note_manager.sort_notes(
-                self._note_manager.notes,
-                True if 'c' in params else False,
-                True if 'd' in params else False,
-            ),
+            len(self._note_manager),
+            lambda offset, limit: self._note_manager.query(order_by, descending, offset, limit),
             True if 'f' in params else False
         )
 
@@ -152,7 +152,7 @@ class NoteManagerCLI:
                     note_args[key] = self._get_value_from_console(InputType.STR, value).strip()
         note_args["created_date"] = datetime.now()
         note_args["id_"] = generate_id()
-        note = Note(**note_args)
+        note = self._note_manager.note_class(**note_args)
         self._note_manager.append_note(note)
         print('\n' + strings.note_created_str, '\n')
         self._print_note_full(note)
@@ -202,12 +202,12 @@ class NoteManagerCLI:
                         input_value = self._get_value_from_console(InputType.STR, strings.enter_username_str)
                         if not self._user_confirmation():
                             continue
-                        note.username = input_value
+                        self._note_manager.update_note(note.id_, username=input_value)
                     case '2':
                         input_value = self._get_value_from_console(InputType.STR, strings.enter_title_str)
                         if not self._user_confirmation():
                             continue
-                        note.title = input_value
+                        self._note_manager.update_note(note.id_, title=input_value)
                     case '3':
                         input_value = self._get_value_from_console(
                             InputType.TEXT,
@@ -215,17 +215,17 @@ class NoteManagerCLI:
                         )
                         if not self._user_confirmation():
                             continue
-                        note.content = input_value
+                        self._note_manager.update_note(note.id_, content=input_value)
                     case '4':
                         input_value = self._state_submenu()
                         if not self._user_confirmation():
                             continue
-                        note.status = input_value
+                        self._note_manager.update_note(note.id_, status=input_value)
                     case '5':
                         input_value = self._get_value_from_console(InputType.DATE, strings.enter_issue_str)
                         if not self._user_confirmation():
                             continue
-                        note.issue_date = input_value
+                        self._note_manager.update_note(note.id_, issue_date=input_value)
                     case '6':
                         break
                     case _:
@@ -336,7 +336,7 @@ class NoteManagerCLI:
 
     def _main_menu(self):
         """The CLI Main menu."""
-        if not self._note_manager.notes:
+        if not len(self._note_manager):
             print(f"\n{Fore.YELLOW}{strings.no_notes_found_str}{Style.RESET_ALL}")
         else:
             self._deadline_check_and_notify()
@@ -382,21 +382,24 @@ class NoteManagerCLI:
                 self._print_note_short(note)
 
     def run(self):
-        """The main function of the CLI."""
+        """The main function of the CLI. The pending saves are written on any exit, Ctrl+C included."""
         self._set_language()
         print('\n' + strings.welcome_str)
-        while True:
-            command = self._main_menu()
-            match command:
-                case '1':
-                    self._create_note()
-                case '2':
-                    self._display_all()
-                case '3':
-                    self._update_note()
-                case '4':
-                    self._delete_note()
-                case '5':
-                    self._search_notes()
-                case '6':
-                    break
+        try:
+            while True:
+                command = self._main_menu()
+                match command:
+                    case '1':
+                        self._create_note()
+                    case '2':
+                        self._display_all()
+                    case '3':
+                        self._update_note()
+                    case '4':
+                        self._delete_note()
+                    case '5':
+                        self._search_notes()
+                    case '6':
+                        break
+        finally:
+            self._note_manager.close()
@@ -22,6 +22,13 @@ class StringsProvider:
         self.empty_list_export_str = _("You're trying to export an empty list.")
         self.deadline_invalid_str = _("The deadline can be only in the future.")
         self.enum_error_str = _("Not an Enum value: ")
+        self.unknown_field_str = _("The note field can't be changed: ")
+        self.unknown_order_str = _("Notes can't be ordered by ")
+        self.wrong_page_str = _("Wrong page bounds: ")
+        self.numpy_missing_str = _("NumPy isn't installed, the columnar store is unavailable.")
+        self.journal_failed_str = _("Journal file IO failed: ")
+        self.cache_failed_str = _("Snapshot cache file IO failed: ")
+        self.unknown_codec_str = _("Unknown file format: ")
 
         # Warnings messages
         self.new_file_str = _("A new file is created.")
@@ -1,9 +1,14 @@
+import tempfile
 import unittest
+from io import StringIO
+from pathlib import Path
 from unittest.mock import mock_open, patch
 from datetime import datetime
 from uuid import UUID
-from model import import_from_yaml, import_from_json, export_to_yaml, export_to_json
-from utils import FileIOError, NoteStatus
+from model import import_from_yaml, import_from_json, export_to_yaml, export_to_json, get_codec, \
+    import_from_jsonl, export_to_jsonl, split_jsonl
+from model.file_io import export_atomically
+from utils import DataIntegrityError, FileIOError, NoteStatus
 
 
 class TestFileIO(unittest.TestCase):
@@ -16,7 +21,7 @@ class TestFileIO(unittest.TestCase):
         """
         with patch('builtins.open', mock_open(read_data=mock_data)):
             with patch(
-                    'yaml.safe_load',
+                    'yaml.load',
                     return_value=[{
                         'id_': '123e4567-e89b-12d3-a456-426614174000',
                         'created_date': datetime(2021, 1, 1, 12, 0),
@@ -30,7 +35,7 @@ class TestFileIO(unittest.TestCase):
 
     def test_import_from_yaml_empty(self):
         with patch('builtins.open', mock_open(read_data="")):
-            with patch('yaml.safe_load', return_value=None):
+            with patch('yaml.load', return_value=None):
                 with self.assertRaises(FileIOError):
                     import_from_yaml('dummy.yaml')
 
@@ -92,6 +97,83 @@ class TestFileIO(unittest.TestCase):
         with self.assertRaises(ValueError):
             export_to_json([], 'dummy.json')
 
+    def test_codec_round_trip(self):
+        data = [{
+            'id_': UUID('123e4567-e89b-12d3-a456-426614174000'),
+            'created_date': datetime(2021, 1, 1, 12, 0),
+            'status': NoteStatus.ACTIVE,
+            'content': 'Пример'
+        }]
+        for name in ('yaml', 'json'):
+            text = StringIO()
+            get_codec(name).dump(data, text)
+            text.seek(0)
+            self.assertEqual([{
+                'id_': '123e4567-e89b-12d3-a456-426614174000',
+                'created_date': '2021-01-01T12:00:00',
+                'status': 'ACTIVE',
+                'content': 'Пример'
+            }], get_codec(name).load(text))
+        with self.assertRaises(ValueError):
+            get_codec('xml')
+
+    def test_jsonl_append_and_split(self):
+        data = [{
+            'id_': UUID(int=i),
+            'created_date': datetime(2021, 1, 1, 12, i),
+            'status': NoteStatus.ACTIVE,
+            'content': 'Строка ' * i
+        } for i in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'notes.jsonl'
+            export_to_jsonl(data[:15], path)
+            export_to_jsonl(iter(data[15:]), path, False)
+            result = list(import_from_jsonl(path))
+            self.assertEqual([str(d['id_']) for d in data], [d['id_'] for d in result])
+            for parts in (1, 3, 7, 50):
+                chunks = split_jsonl(path, parts)
+                self.assertEqual(result, [d for start, end in chunks for d in import_from_jsonl(path, start, end)])
+
+    def test_streaming_export(self):
+        data = [{
+            'id_': UUID(int=i),
+            'created_date': datetime(2021, 1, 1, 12, i % 60),
+            'issue_date': datetime.min,
+            'status': NoteStatus.ACTIVE,
+            'content': 'Строка: "текст"\n' * (i % 3)
+        } for i in range(600)]
+        for name, export in (('yaml', export_to_yaml), ('json', export_to_json)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / ('notes.' + name)
+                whole = StringIO()
+                get_codec(name).dump(data, whole)
+                export(iter(data), path)
+                self.assertEqual(whole.getvalue(), path.read_text(encoding='utf-8'))
+                with self.assertRaises(ValueError):
+                    export(iter([]), path)
+
+    def test_export_atomically(self):
+        def broken():
+            yield {'id_': '1'}
+            raise DataIntegrityError('broken')
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'notes.yaml'
+            path.write_text('- id_: old\n', encoding='utf-8')
+            with self.assertRaises(DataIntegrityError):
+                export_atomically(export_to_yaml, broken(), path)
+            self.assertEqual('- id_: old\n', path.read_text(encoding='utf-8'))
+            self.assertFalse(Path(directory, 'notes.yaml.tmp').exists())
+            export_atomically(export_to_yaml, iter([]), path)
+            self.assertEqual('', path.read_text(encoding='utf-8'))
+
+    def test_import_from_jsonl_broken(self):
+        with patch('builtins.open', mock_open(read_data=b'{"id_": 1}\n{broken\n')):
+            with self.assertRaises(FileIOError):
+                list(import_from_jsonl('dummy.jsonl'))
+        with patch('builtins.open', mock_open(read_data=b'\n')):
+            with self.assertRaises(FileIOError):
+                list(import_from_jsonl('dummy.jsonl'))
+
 
 if __name__ == '__main__':
     unittest.main()
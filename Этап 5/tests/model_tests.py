@@ -1,16 +1,32 @@
+import gc
+import json
+import tempfile
 import unittest
+import warnings
+import weakref
+from copy import copy
+from dataclasses import asdict
 from datetime import datetime, timedelta
 from pathlib import Path
-from uuid import uuid4
-from model import NoteManager
-from utils import NoteStatus
+from unittest.mock import patch
+from uuid import UUID, uuid4
+from model import export_to_yaml, import_from_yaml, schema_for, ColumnarNoteStore, CompactNote, Note, NoteManager, \
+    StatusIs, UsernameIs, Keyword, CreatedBetween, IssueBetween
+from utils import DataIntegrityError, FileIOError, NoteStatus
 
 
 class TestNoteManager(unittest.TestCase):
     def setUp(self):
+        catcher = warnings.catch_warnings()
+        catcher.__enter__()
+        self.addCleanup(catcher.__exit__, None, None, None)
+        warnings.simplefilter("ignore")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
         self.note_manager = NoteManager()
         if self.note_manager.notes:
-            self.note_manager._notes.clear()
+            self.note_manager.clear_notes()
         self.note_manager.storage_path = Path("test.yaml")
         self.note_dicts = [
             {
@@ -33,6 +49,11 @@ class TestNoteManager(unittest.TestCase):
             }
         ]
 
+    def _manager(self, name=None, **options):
+        # The manager with the file storage in the temporary directory of the test
+        name = name or "notes." + options.get("storage_format", "yaml")
+        return NoteManager(storage_path=self.directory / name, **options)
+
     def test_dict_import_export(self):
         # Testing a dict-Note-Note-dict converting functions
         self.note_manager.import_notes_from_dicts(self.note_dicts)
@@ -48,7 +69,7 @@ class TestNoteManager(unittest.TestCase):
         # Testing a save/load to/from a file and converting functions
         self.note_manager.import_notes_from_dicts(self.note_dicts)
         self.note_manager.save_notes_to_file()
-        self.note_manager._notes.clear()
+        self.note_manager.clear_notes()
         self.note_manager.load_notes_from_file()
         dicts_from_note_manager = self.note_manager.export_notes_as_dicts()
         for d in dicts_from_note_manager:
@@ -73,6 +94,514 @@ class TestNoteManager(unittest.TestCase):
         id_ = test_note.id_
         self.assertEqual(test_note, self.note_manager.get_note_by_id(id_))
 
+    def test_id_index_after_delete(self):
+        # Testing that the id_ index and the insertion order stay consistent after deletion
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.note_manager.delete_note_by_id(first.id_)
+        with self.assertRaises(ValueError):
+            self.note_manager.get_note_by_id(first.id_)
+        with self.assertRaises(ValueError):
+            self.note_manager.delete_note_by_id(first.id_)
+        self.assertEqual(-1, self.note_manager._get_note_index_by_id(first.id_))
+        self.assertEqual([second], self.note_manager.notes)
+        self.assertIs(second, self.note_manager.get_note_by_id(second.id_))
+
+    def test_filter_by_keywords(self):
+        # Testing that the keyword index gives the same results as the plain substring search
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([first, second], self.note_manager.filter_notes(["TEST"]))
+        self.assertEqual([second], self.note_manager.filter_notes(["ntent2"]))
+        self.assertEqual([second], self.note_manager.filter_notes(["nt2 for u"]))
+        self.assertEqual([first, second], self.note_manager.filter_notes([" "]))
+        self.assertEqual([], self.note_manager.filter_notes(["missing"]))
+        self.assertEqual([], self.note_manager.filter_notes(["test"], NoteStatus.COMPLETED))
+        self.assertEqual([first, second], self.note_manager.filter_notes(["t c"]))
+        self.assertEqual([second], self.note_manager.filter_notes(["2 f", "zzz"]))
+        self.assertEqual([first, second], self.note_manager.filter_notes(["s"]))
+
+    def test_filter_after_update(self):
+        # Testing that the keyword index follows the note updates
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first = self.note_manager.notes[0]
+        self.note_manager.update_note(first.id_, title="Groceries")
+        self.assertEqual([first], self.note_manager.filter_notes(["grocer"]))
+        self.assertEqual("Groceries", self.note_manager.get_note_by_id(first.id_).title)
+        with self.assertRaises(ValueError):
+            self.note_manager.update_note(first.id_, id_=uuid4())
+
+    def test_filter_and_delete_by_state(self):
+        # Testing the status index for filtering and the bulk deletion
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.note_manager.update_note(second.id_, status=NoteStatus.COMPLETED)
+        self.assertEqual([first], self.note_manager.filter_notes(state=NoteStatus.ACTIVE))
+        self.assertEqual([second], self.note_manager.filter_notes(["test"], NoteStatus.COMPLETED))
+        self.assertTrue(self.note_manager.delete_by_state(NoteStatus.ACTIVE))
+        self.assertFalse(self.note_manager.delete_by_state(NoteStatus.ACTIVE))
+        self.assertEqual([second], self.note_manager.notes)
+        self.assertEqual([second], self.note_manager.filter_notes(["test"]))
+
+    def test_urgent_notes(self):
+        # Testing the urgency buckets sliced from the deadline index
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([[], [second], []], self.note_manager.get_urgent_notes_sorted())
+        self.note_manager.update_note(first.id_, issue_date=datetime.now() - timedelta(days=2))
+        self.note_manager.update_note(second.id_, issue_date=datetime.now() - timedelta(days=1))
+        self.assertEqual([[second, first], [], []], self.note_manager.get_urgent_notes_sorted())
+        self.note_manager.update_note(second.id_, status=NoteStatus.TERMLESS)
+        self.assertEqual([[first], [], []], self.note_manager.get_urgent_notes_sorted())
+        deadline = (datetime.now() - timedelta(days=3)).isoformat()
+        self.note_manager.import_notes_from_dicts([dict(self.note_dicts[0], id_=str(uuid4()), issue_date=deadline)
+                                                   for _ in range(3)])
+        missed = self.note_manager.get_urgent_notes_sorted()[0]
+        self.assertEqual(self.note_manager.sort_notes(missed, False, False), missed)
+        self.assertEqual([first] + self.note_manager.notes[2:], missed)
+        self.note_manager.update_note(missed[1].id_, status=NoteStatus.POSTPONED)
+        self.assertEqual(missed, self.note_manager.get_urgent_notes_sorted()[0])
+        with patch("model.indexes.BULK_SIZE", 2):
+            self.note_manager.update_many({note.id_: {"issue_date": datetime.min} for note in missed[1:]})
+            self.assertEqual(missed[1:] + missed[:1], self.note_manager.get_urgent_notes_sorted()[0])
+
+    def test_sorted_views(self):
+        # Testing the sorted views against the sort_notes function
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        notes = self.note_manager.notes
+        self.assertEqual(self.note_manager.sort_notes(notes), self.note_manager.sorted_notes())
+        self.assertEqual(self.note_manager.sort_notes(notes, False), self.note_manager.sorted_notes(False))
+        self.assertEqual(notes, self.note_manager.sorted_notes(True, False))
+        self.note_manager.update_note(notes[1].id_, created_date=datetime.min, issue_date=datetime.min)
+        self.assertEqual(notes, self.note_manager.sorted_notes())
+        self.assertEqual([notes[1], notes[0]], self.note_manager.sorted_notes(False))
+        self.assertEqual([notes[0], notes[1]], self.note_manager.sorted_notes(False, False))
+        undated = [dict(self.note_dicts[0], id_=str(uuid4()), issue_date=datetime.min.isoformat()) for _ in range(4)]
+        self.note_manager.import_notes_from_dicts(undated)
+        expected = self.note_manager.sort_notes(self.note_manager.notes, False)
+        self.assertEqual(expected, self.note_manager.sorted_notes(False))
+        self.assertEqual(expected[2:5], self.note_manager.query("issue_date", True, 2, 3))
+        self.note_manager.update_note(expected[1].id_, issue_date=datetime.now())
+        self.note_manager.update_note(expected[1].id_, issue_date=datetime.min)
+        self.assertEqual(expected, self.note_manager.sorted_notes(False))
+        with patch("model.indexes.BULK_SIZE", 2):
+            self.note_manager.import_notes_from_dicts(undated[:3] + [dict(undated[0], id_=str(uuid4()))])
+            self.note_manager.delete_many([expected[2].id_, expected[3].id_, expected[4].id_])
+            expected = self.note_manager.sort_notes(self.note_manager.notes, False)
+            self.assertEqual(expected, self.note_manager.sorted_notes(False))
+            self.assertEqual(self.note_manager.sort_notes(self.note_manager.notes), self.note_manager.sorted_notes())
+
+    def test_query_pages(self):
+        # Testing the paginated query by the sorted views and by the heap selection
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([second], self.note_manager.query(offset=0, limit=1))
+        self.assertEqual([first], self.note_manager.query(offset=1, limit=1))
+        self.assertEqual([], self.note_manager.query(offset=2, limit=1))
+        self.assertEqual([second], self.note_manager.query("issue_date", False, 0, 1))
+        self.assertEqual([first], self.note_manager.query("title", False, 0, 1))
+        self.assertEqual([first], self.note_manager.query("username", True, 1))
+        with self.assertRaises(ValueError):
+            self.note_manager.query("content")
+
+    def test_find_and_explain(self):
+        # Testing the composable queries and the chosen plan
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([second], self.note_manager.find(UsernameIs("tester2")))
+        self.assertEqual([first], self.note_manager.find(Keyword("test") & ~UsernameIs("tester2")))
+        self.assertEqual([first, second], self.note_manager.find(StatusIs(NoteStatus.ACTIVE) | Keyword("x")))
+        self.assertEqual([second], self.note_manager.find(IssueBetween(end=datetime.now() + timedelta(days=2))))
+        self.assertEqual([], self.note_manager.find(CreatedBetween(start=datetime.now())))
+        self.note_manager.import_notes_from_dicts([dict(self.note_dicts[1], id_=str(uuid4()), username="other")
+                                                   for _ in range(6)])
+        plan = self.note_manager.explain(StatusIs(NoteStatus.ACTIVE) & UsernameIs("tester"))
+        self.assertIn("username index", plan.splitlines()[1])
+        self.assertIn("verify status = ACTIVE", plan)
+        plan = self.note_manager.explain(Keyword("test") | Keyword("t"))
+        self.assertTrue(plan.startswith("scan"))
+        self.assertIn("keyword index", plan)
+        self.assertEqual(self.note_manager.notes, self.note_manager.find(Keyword("test") | Keyword("t")))
+
+    def test_result_cache(self):
+        # Testing that repeated queries hit the cache and mutations invalidate it
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([first, second], self.note_manager.filter_notes(["test"]))
+        hits = self.note_manager.cache_info().hits
+        self.assertEqual([first, second], self.note_manager.filter_notes([" TEST"]))
+        self.assertEqual(hits + 1, self.note_manager.cache_info().hits)
+        self.note_manager.get_urgent_notes_sorted()
+        self.assertEqual([[], [second], []], self.note_manager.get_urgent_notes_sorted())
+        self.assertEqual(hits + 2, self.note_manager.cache_info().hits)
+        self.note_manager.update_note(first.id_, username="Other", title="Other", content="Other")
+        self.assertEqual([second], self.note_manager.filter_notes(["test"]))
+        self.note_manager.delete_note_by_id(second.id_)
+        self.assertEqual([[], [], []], self.note_manager.get_urgent_notes_sorted())
+        self.assertEqual(hits + 2, self.note_manager.cache_info().hits)
+
+    def test_iter_notes_and_filter(self):
+        # Testing the lazy iteration over the notes and the filter results
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.assertEqual([first, second], list(self.note_manager.iter_notes()))
+        self.assertIs(first, next(self.note_manager.iter_filter(["test"])))
+        self.assertEqual([second], list(self.note_manager.iter_filter(["content2"], NoteStatus.ACTIVE)))
+        self.assertIsNone(next(self.note_manager.iter_filter(state=NoteStatus.COMPLETED), None))
+
+    def test_columnar_store(self):
+        # Testing that the columnar store gives the same results as the indexes
+        try:
+            import numpy # noqa
+        except ImportError:
+            self.skipTest("NumPy isn't installed")
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        self.note_manager.update_note(first.id_, issue_date=datetime.now() - timedelta(days=1))
+        store = ColumnarNoteStore(self.note_manager.notes)
+        self.assertEqual(self.note_manager.get_urgent_notes_sorted(), store.urgent(datetime.now()))
+        self.assertEqual(self.note_manager.status_counts(), store.status_counts())
+        start = datetime.now() - timedelta(hours=1)
+        self.assertEqual(self.note_manager.notes_between("issue_date", start), store.between("issue_date", start))
+        self.assertEqual([second], store.between("issue_date", start))
+        columnar_manager = self._manager(columnar=True)
+        columnar_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = columnar_manager.notes
+        self.assertEqual([[], [second], []], columnar_manager.get_urgent_notes_sorted())
+        columnar_manager.update_note(second.id_, status=NoteStatus.COMPLETED)
+        columnar_manager.update_note(first.id_, issue_date=datetime.now() - timedelta(days=1))
+        self.assertEqual([[first], [], []], columnar_manager.get_urgent_notes_sorted())
+        self.assertEqual([first, second], columnar_manager.notes_between("created_date"))
+        columnar_manager.delete_note_by_id(first.id_)
+        self.assertEqual({**dict.fromkeys(NoteStatus, 0), NoteStatus.COMPLETED: 1}, columnar_manager.status_counts())
+        self.assertEqual([second], columnar_manager.notes_between("created_date"))
+
+    def test_compact_notes(self):
+        # Testing that the slotted notes give the same dicts as the dataclass ones
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        compact_manager = self._manager(compact_notes=True)
+        compact_manager.import_notes_from_dicts(self.note_dicts)
+        self.assertEqual(self.note_manager.export_notes_as_dicts(), compact_manager.export_notes_as_dicts())
+        note = compact_manager.notes[0]
+        self.assertIsInstance(note, CompactNote)
+        self.assertFalse(hasattr(note, "__dict__"))
+        compact_manager.update_note(note.id_, username="".join(["Test", "er2"]))
+        self.assertIs(note.username, compact_manager.notes[1].username)
+        self.assertEqual(asdict(self.note_manager.notes[1]), asdict(compact_manager.notes[1]))
+
+    def test_compressed_content(self):
+        # Testing that the compressed bodies are transparent for the filter and the export
+        self.note_dicts[1]['content'] = "Long content " * 1000 + "needle"
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        for compact in (False, True):
+            manager = self._manager(compact_notes=compact, compress_content=True)
+            manager.import_notes_from_dicts(self.note_dicts)
+            note = manager.notes[1]
+            self.assertIsInstance(note._content, bytes)
+            self.assertLess(len(note._content), len(self.note_dicts[1]['content']))
+            self.assertEqual(self.note_dicts[1]['content'], note.content)
+            self.assertEqual([note], manager.filter_notes(["NEEDLE"]))
+            self.assertEqual(self.note_manager.export_notes_as_dicts(), manager.export_notes_as_dicts())
+            manager.update_note(note.id_, content="short")
+            self.assertEqual("short", note._content)
+            self.assertEqual([], manager.filter_notes(["needle"]))
+            self.assertEqual([note], manager.filter_notes(["shor"]))
+        codec = manager.content_codec
+        codec.cache_chars = 10000
+        texts = ["Body %d " % i * 1000 for i in range(5)]
+        self.assertEqual(texts, [codec.unpack(codec.pack(text)) for text in texts])
+        self.assertLessEqual(sum(map(len, codec._hot.values())), codec.cache_chars)
+
+    def test_title_edit_keeps_body_packed(self):
+        # Testing that editing the title of a compressed note neither decompresses nor compresses its body
+        self.note_dicts[1]['content'] = "Long content " * 1000 + "needle"
+        manager = self._manager(compact_notes=True, compress_content=True)
+        manager.import_notes_from_dicts(self.note_dicts)
+        note = manager.notes[1]
+        codec = manager.content_codec
+        with patch.object(codec, "_compress", wraps=codec._compress) as compress, \
+                patch.object(codec, "_decompress", wraps=codec._decompress) as decompress:
+            manager.update_note(note.id_, title="Renamed")
+            with manager.batch():
+                manager.update_note(note.id_, title="Renamed twice")
+            self.assertIs(note._content, copy(note)._content)
+            self.assertEqual(0, compress.call_count)
+            self.assertEqual(0, decompress.call_count)
+        self.assertEqual([note], manager.filter_notes(["twice"]))
+        self.assertEqual([note], manager.filter_notes(["needle"]))
+
+    def test_batch_single_save(self):
+        # Testing that a batch of mutations is saved to the file storage once
+        notes = [self.note_manager._from_dict(d) for d in self.note_dicts]
+        self.note_manager.storage_path = self.directory / "notes.yaml"
+        with patch('model.note_manager.export_to_yaml', wraps=export_to_yaml) as export:
+            with self.note_manager.batch():
+                self.note_manager.add_many(notes)
+                self.note_manager.update_note(notes[0].id_, title="Batch")
+                self.note_manager.delete_note_by_id(notes[1].id_)
+                self.note_manager.save_notes_to_file()
+            export.assert_called_once()
+        self.assertEqual([notes[0]], self.note_manager.filter_notes(["batch"]))
+        self.assertEqual([notes[0]], self.note_manager.sorted_notes())
+
+    def test_batch_rollback(self):
+        # Testing that a batch is rolled back if saving to the file storage fails
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first, second = self.note_manager.notes
+        with patch('model.note_manager.export_to_yaml', side_effect=FileIOError("disk full")):
+            with self.assertRaises(FileIOError):
+                with self.note_manager.batch():
+                    self.note_manager.delete_note_by_id(first.id_)
+                    self.note_manager.update_note(second.id_, title="Changed", status=NoteStatus.COMPLETED)
+                    added = dict(self.note_dicts[0], id_=str(uuid4()))
+                    self.note_manager.append_note(self.note_manager._from_dict(added))
+        self.assertEqual([first, second], self.note_manager.notes)
+        self.assertIs(first, self.note_manager.get_note_by_id(first.id_))
+        self.assertEqual("Test2", second.title)
+        self.assertEqual([first, second], self.note_manager.filter_notes(state=NoteStatus.ACTIVE))
+        self.assertEqual([first, second], self.note_manager.find(UsernameIs("tester") | UsernameIs("tester2")))
+
+    def test_write_behind_batch_rollback(self):
+        # Testing that a batch waits for the background save and is rolled back if the save fails
+        note_manager = self._manager(write_behind=True)
+        note_manager.import_notes_from_dicts(self.note_dicts)
+        note_manager.save_notes_to_file()
+        note_manager.flush()
+        first, second = note_manager.notes
+        with patch('model.note_manager.export_to_yaml', side_effect=FileIOError("disk full")):
+            with self.assertRaises(FileIOError):
+                with note_manager.batch():
+                    note_manager.delete_note_by_id(first.id_)
+                    note_manager.update_note(second.id_, title="Changed")
+        self.assertEqual([first, second], note_manager.notes)
+        self.assertIs(first, note_manager.get_note_by_id(first.id_))
+        self.assertEqual("Test2", second.title)
+        self.assertEqual([second], note_manager.filter_notes(["test2"]))
+        self.assertTrue(note_manager.dirty)
+        note_manager.close()
+        self.assertEqual(2, len(import_from_yaml(note_manager.storage_path)))
+
+    def test_journal_replay(self):
+        # Testing that the journaled changes are restored after a reload without rewriting the storage
+        note_manager = self._manager(journaled=True)
+        first, second = [note_manager._from_dict(d) for d in self.note_dicts]
+        note_manager.append_note(first)
+        note_manager.append_note(second)
+        note_manager.update_note(first.id_, title="Changed", status=NoteStatus.POSTPONED)
+        note_manager.delete_note_by_id(second.id_)
+        self.assertEqual(0, note_manager.storage_path.stat().st_size)
+        reloaded = self._manager(journaled=True)
+        self.assertEqual(note_manager.notes, reloaded.notes)
+        self.assertEqual([first.id_], [note.id_ for note in reloaded.filter_notes(state=NoteStatus.POSTPONED)])
+
+    def test_journal_compaction(self):
+        # Testing that the compaction folds the journal into the storage file
+        note_manager = self._manager(journaled=True)
+        note_manager.add_many(note_manager._from_dict(d) for d in self.note_dicts)
+        self.assertEqual(0, note_manager.storage_path.stat().st_size)
+        self.assertEqual(2, len(list(note_manager._journal.replay())))
+        note_manager.delete_note_by_id(note_manager.notes[0].id_)
+        note_manager._compact_journal()
+        note_manager.close()
+        self.assertFalse(note_manager._journal.rotated_path.exists())
+        saved = import_from_yaml(note_manager.storage_path)
+        self.assertEqual([note.id_ for note in note_manager.notes], [UUID(d['id_']) for d in saved])
+        self.assertEqual(note_manager.notes, self._manager(journaled=True).notes)
+
+    def test_write_behind_coalesced_save(self):
+        # Testing that a burst of changes is saved once by the background thread when flushed
+        note_manager = self._manager(write_behind=True)
+        with patch('model.note_manager.export_to_yaml', wraps=export_to_yaml) as export:
+            for d in self.note_dicts:
+                note_manager.append_note(note_manager._from_dict(d))
+            note_manager.update_note(note_manager.notes[0].id_, title="Changed")
+            note_manager.save_notes_to_file()
+            note_manager.close()
+        self.assertEqual(1, export.call_count)
+        self.assertFalse(Path(self.directory, "notes.yaml.tmp").exists())
+        saved = import_from_yaml(note_manager.storage_path)
+        self.assertEqual(["Changed", "Test2"], [d["title"] for d in saved])
+
+    def test_write_behind_snapshot(self):
+        # Testing that a scheduled save keeps the notes as they were and copies only the notes changed afterwards
+        note_manager = self._manager(write_behind=True)
+        note_manager.import_notes_from_dicts(self.note_dicts)
+        with patch('model.persister.copy', wraps=copy) as copied:
+            note_manager.save_notes_to_file()
+            self.assertEqual(0, copied.call_count)
+            note_manager.update_note(note_manager.notes[0].id_, title="Changed", content="Changed content")
+            note_manager.flush()
+        self.assertEqual(1, copied.call_count)
+        saved = import_from_yaml(note_manager.storage_path)
+        self.assertEqual(self.note_dicts[0]["content"], saved[0]["content"])
+        self.assertEqual(["Test", "Test2"], [d["title"] for d in saved])
+        self.assertTrue(note_manager.dirty)
+        note_manager.save_notes_to_file()
+        note_manager.close()
+        self.assertEqual(["Changed", "Test2"], [d["title"] for d in import_from_yaml(note_manager.storage_path)])
+
+    def test_write_behind_failed_save(self):
+        # Testing that a failed background save is warned about and doesn't stop the saving thread
+        note_manager = self._manager(write_behind=True)
+        note_manager.import_notes_from_dicts(self.note_dicts)
+        with patch('model.note_manager.export_to_yaml', side_effect=ValueError("broken")):
+            note_manager.save_notes_to_file()
+            with self.assertWarns(UserWarning):
+                note_manager.flush()
+        self.assertTrue(note_manager.dirty)
+        note_manager.save_notes_to_file()
+        note_manager.close()
+        self.assertEqual(2, len(import_from_yaml(note_manager.storage_path)))
+
+    def test_write_behind_last_note_deleted(self):
+        # Testing that the background save empties the file storage when the last note is deleted
+        note_manager = self._manager(write_behind=True)
+        note_manager.import_notes_from_dicts(self.note_dicts[:1])
+        note_manager.save_notes_to_file()
+        note_manager.flush()
+        note_manager.delete_note_by_id(note_manager.notes[0].id_)
+        note_manager.save_notes_to_file()
+        note_manager.close()
+        self.assertEqual("", note_manager.storage_path.read_text(encoding="utf-8"))
+
+    def test_dirty_tracking(self):
+        # Testing that the saves are skipped when nothing changed after the last one
+        self.note_manager.storage_path = self.directory / "notes.yaml"
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        first = self.note_manager.notes[0]
+        self.assertTrue(self.note_manager.dirty)
+        self.note_manager.save_notes_to_file()
+        self.assertFalse(self.note_manager.dirty)
+        with patch('model.note_manager.export_to_yaml', wraps=export_to_yaml) as export:
+            self.note_manager.update_note(first.id_, title=first.title, status=first.status)
+            self.note_manager.save_notes_to_file()
+            export.assert_not_called()
+            self.note_manager.update_note(first.id_, title="Changed")
+            self.assertTrue(self.note_manager.is_dirty(first.id_))
+            self.note_manager.save_notes_to_file()
+            export.assert_called_once()
+        self.assertFalse(self.note_manager.is_dirty(first.id_))
+
+    def test_journal_batch_writes_dirty_notes(self):
+        # Testing that a batch appends only the changed notes to the journal
+        note_manager = self._manager(journaled=True)
+        note_manager.add_many(note_manager._from_dict(d) for d in self.note_dicts)
+        note_manager._compact_journal(background=False)
+        first, second = note_manager.notes
+        with note_manager.batch():
+            note_manager.update_note(first.id_, title="Changed")
+            note_manager.update_note(second.id_, title=second.title)
+        records = list(note_manager._journal.replay())
+        self.assertEqual([("add", str(first.id_))], [(r["op"], r["note"]["id_"]) for r in records])
+        self.assertEqual(note_manager.notes, self._manager(journaled=True).notes)
+
+    def test_snapshot_cache(self):
+        # Testing that a fresh snapshot cache is loaded instead of parsing the file and a stale one is ignored
+        note_manager = self._manager(snapshot_cache=True)
+        note_manager.import_notes_from_dicts(self.note_dicts)
+        note_manager.save_notes_to_file()
+        self.assertTrue(Path(self.directory, "notes.yaml.cache").is_file())
+        with patch('model.note_manager.import_from_yaml') as parse:
+            self.assertEqual(note_manager.notes, self._manager(snapshot_cache=True).notes)
+            parse.assert_not_called()
+        export_to_yaml(self.note_dicts[:1], note_manager.storage_path)
+        self.assertEqual(1, len(self._manager(snapshot_cache=True).notes))
+
+    def test_snapshot_cache_refresh(self):
+        # Testing that the appended notes refresh the snapshot cache on close and a tampered cache is ignored
+        note_manager = self._manager(snapshot_cache=True)
+        note_manager.import_notes_from_dicts(self.note_dicts[:1])
+        note_manager.save_notes_to_file()
+        with patch('model.note_manager.SnapshotCache.store') as store:
+            note_manager.append_note(note_manager._from_dict(self.note_dicts[1]))
+            store.assert_not_called()
+        note_manager.close()
+        with patch('model.note_manager.import_from_yaml') as parse:
+            self.assertEqual(note_manager.notes, self._manager(snapshot_cache=True).notes)
+            parse.assert_not_called()
+        cache_path = Path(self.directory, "notes.yaml.cache")
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        cached["notes"][0]["status"] = "BROKEN"
+        cache_path.write_text(json.dumps(cached), encoding="utf-8")
+        self.assertEqual(note_manager.notes, self._manager(snapshot_cache=True).notes)
+
+    def test_jsonl_storage(self):
+        # Testing that the JSON Lines storage is appended to and loaded back
+        note_manager = self._manager(storage_format="jsonl")
+        for d in self.note_dicts:
+            note_manager.append_note(note_manager._from_dict(d))
+        self.assertEqual(2, len(note_manager.storage_path.read_text(encoding="utf-8").splitlines()))
+        self.assertEqual(note_manager.notes, self._manager(storage_format="jsonl").notes)
+
+    def test_export_notes_to_file(self):
+        # Testing that a filtered subset of notes is exported in the given format and loaded back
+        note_manager = self._manager()
+        for d in self.note_dicts:
+            note_manager.append_note(note_manager._from_dict(d))
+        subset = note_manager.filter_notes(state=note_manager.notes[0].status)
+        for file_format in ("yaml", "json", "jsonl"):
+            name = "export." + file_format
+            note_manager.export_notes_to_file(self.directory / name, iter(subset), file_format)
+            reloaded = self._manager(name, storage_format="jsonl" if file_format == "jsonl" else "yaml")
+            self.assertEqual(subset, reloaded.notes)
+        with self.assertRaises(ValueError):
+            note_manager.export_notes_to_file(self.directory / "export.xml", file_format="xml")
+
+    def test_lazy_notes(self):
+        # Testing that the lazy notes parse the fields on the first access and report the broken ones
+        broken = dict(self.note_dicts[1], created_date="yesterday")
+        export_to_yaml([self.note_dicts[0], broken], self.directory / "notes.yaml")
+        note_manager = self._manager(lazy_notes=True)
+        first, second = note_manager.notes
+        self.assertIsInstance(first._issue_date, str)
+        self.assertEqual(datetime.fromisoformat(self.note_dicts[0]['issue_date']), first.issue_date)
+        self.assertIsInstance(first._issue_date, datetime)
+        self.assertEqual(NoteStatus.ACTIVE, second.status)
+        with self.assertRaises(DataIntegrityError):
+            second.created_date
+        note_manager.update_note(second.id_, created_date=datetime.now())
+        self.assertEqual([first, second], note_manager.filter_notes(["test"]))
+        note_manager = self._manager(lazy_notes=True)
+        first = note_manager.notes[0]
+        note_manager.update_note(first.id_, title="Changed")
+        with self.assertWarns(UserWarning):
+            note_manager.save_notes_to_file()
+        self.assertEqual([first], note_manager.notes)
+        self.assertEqual([first], note_manager.filter_notes(["test"]))
+        self.assertEqual([[], [], []], note_manager.get_urgent_notes_sorted())
+        self.assertEqual(["Changed"], [d["title"] for d in import_from_yaml(note_manager.storage_path)])
+
+    def test_note_schema(self):
+        # Testing that the compiled schema converts the dicts like asdict() and _from_dict() did
+        for note_class in (Note, CompactNote):
+            schema = schema_for(note_class)
+            note = schema.decode(self.note_dicts[0])
+            self.assertIsInstance(note, note_class)
+            self.assertEqual(asdict(note), schema.encode(note))
+            self.assertEqual(NoteStatus.ACTIVE, note.status)
+        with self.assertRaises(DataIntegrityError):
+            schema_for(Note).decode({key: value for key, value in self.note_dicts[0].items() if key != 'title'})
+        with self.assertRaises(DataIntegrityError):
+            schema_for(Note).decode(dict(self.note_dicts[0], status='DONE'))
+
+    def test_note_classes_freed(self):
+        # Testing that the note classes made for a manager and their cached schemas are freed with the manager
+        note_manager = self._manager(compact_notes=True, compress_content=True, lazy_notes=True)
+        note_manager.import_notes_from_dicts(self.note_dicts)
+        note_class = weakref.ref(note_manager.note_class)
+        self.assertIs(note_class(), schema_for(note_class()).note_class)
+        note_manager.close()
+        del note_manager
+        gc.collect()
+        self.assertIsNone(note_class())
+
+    def test_serialized_notes(self):
+        # Testing that the notes are serialized to the primitive values lazily
+        self.note_manager.import_notes_from_dicts(self.note_dicts)
+        serialized = self.note_manager.iter_serialized_notes()
+        self.assertNotIsInstance(serialized, list)
+        self.assertEqual(self.note_dicts, list(serialized))
+
 
 if __name__ == '__main__':
     unittest.main()